@@ -2,4 +2,4 @@ import uvicorn
 from src.api.app import app
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True, loop="uvloop", http="httptools")
\ No newline at end of file
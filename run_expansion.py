@@ -3,8 +3,11 @@ import argparse
 from dotenv import load_dotenv
 
 from src.services.expansion_service import get_expansion_service
+from src.tools.search import MessageSearchTool
+from src.observability.logfire_config import configure_logfire
 
 load_dotenv()
+configure_logfire()
 
 async def main():
     """
@@ -17,6 +20,17 @@ async def main():
         default=1000, 
         help="Number of messages to process in one batch (default: 1000)"
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="Number of batches expanded concurrently (default: EXPANSION_CONCURRENCY or 16)"
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Rebuild the vector search index once after all expansions are saved"
+    )
     parser.add_argument(
         "--stats", 
         action="store_true", 
@@ -47,10 +61,14 @@ async def main():
     
     if stats['pending_messages'] > 0:
         print(f"🔄 Processing up to {args.batch_size} messages...")
-        processed = await service.process_new_messages(batch_size=args.batch_size)
+        processed = await service.process_new_messages(batch_size=args.batch_size, concurrency=args.concurrency)
         print(f"✅ Successfully processed {processed} messages")
     else:
         print("✅ All messages are already expanded")
+    
+    if args.bulk:
+        print("🔍 Rebuilding vector search index...")
+        MessageSearchTool().rebuild_index()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -7,7 +7,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 def reset_expansion_database():
     """
-    Resets the expansion database by deleting the database file.
+    Resets the expansion database by deleting the database file and its WAL sidecars.
     """
     load_dotenv()
     
@@ -19,12 +19,16 @@ def reset_expansion_database():
     db_abs_path = os.path.abspath(expansion_db_path)
     
     if os.path.exists(db_abs_path):
-        try:
-            os.remove(db_abs_path)
-            print(f"✅ Successfully deleted expansion database: {db_abs_path}")
-        except OSError as e:
-            print(f"❌ Error deleting file: {db_abs_path}")
-            print(f"   Reason: {e}")
+        # Remove the database together with its WAL and shared-memory sidecars
+        for path in (db_abs_path, f"{db_abs_path}-wal", f"{db_abs_path}-shm"):
+            if not os.path.exists(path):
+                continue
+            try:
+                os.remove(path)
+                print(f"✅ Successfully deleted expansion database file: {path}")
+            except OSError as e:
+                print(f"❌ Error deleting file: {path}")
+                print(f"   Reason: {e}")
     else:
         print(f"ℹ️ Expansion database not found at: {db_abs_path}")
         print("   Nothing to do.")
@@ -1,128 +1,194 @@
-from typing import List
-from pydantic import BaseModel, Field
+import asyncio
+import functools
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+import anthropic
 import logfire
+import openai
+import tiktoken
 
 from ..models.agent import AgentContext, SearchToolInput, LLMPrompt
 from ..models.api import QueryResponse, SourceMessage
 from ..models.database import TelegramMessage
 from ..tools.search import get_search_tool
+from ..cache.query_cache import get_query_cache
 from ..llm.factory import LLMFactory
 from ..observability.logfire_config import log_agent_operation
+from ..settings import SETTINGS
 
+# Instructions sent with every query
+SYSTEM_PROMPT = """You are an AI assistant that helps users find information from their Telegram message history. 
 
-class TelequeryAgent(BaseModel):
-    """Pydantic-based agent for processing Telegram message queries."""
+Your task is to:
+1. Analyze the provided message context carefully
+2. Answer the user's question based ONLY on the information in the messages
+3. Cite specific messages when possible by mentioning the sender and approximate time
+4. If you cannot find a clear answer in the messages, say so clearly
+5. Do not make up information or hallucinate responses
+
+Be concise but informative in your responses."""
+
+# Template for each message in the LLM context block
+CONTEXT_MESSAGE_FORMAT = "Message from {sender} at {time}:\n{text}"
+
+
+@functools.lru_cache(maxsize=1)
+def _no_results_counter():
+    """Counter for queries answered by the no-results fast path (created after logfire is configured)."""
+    return logfire.metric_counter(
+        "agent.no_results",
+        unit="1",
+        description="Queries answered without an LLM call because no relevant messages were found"
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _get_encoding() -> Optional[tiktoken.Encoding]:
+    """Load the tokenizer used by the default OpenAI chat models, or None if it cannot be loaded.
+    
+    The encoding is baked into the Docker image; elsewhere tiktoken downloads it on first use.
+    """
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logfire.warn("tiktoken encoding unavailable, estimating tokens from length: {error}", error=str(e))
+        return None
+
+
+def _count_tokens(text: str) -> int:
+    """Count the tokens in text, estimated as roughly one per four characters without a tokenizer."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+@dataclass(slots=True)
+class TelequeryAgent:
+    """Agent for processing Telegram message queries."""
     
     llm_provider_name: str = "openai"
     max_context_messages: int = 100
+    max_context_tokens: int = SETTINGS.max_context_tokens
     database_url: str = "sqlite:///./telegram_messages.db"
     chroma_path: str = "./chroma_db"
     expansion_db_path: str = "./data/telequery_expansions.db"
+    _llm_provider: Any = field(default=None, init=False, repr=False)
     
-    # Private fields excluded from Pydantic model
-    class Config:
-        arbitrary_types_allowed = True
-    
-    def __init__(self, **data):
-        super().__init__(**data)
-        # Store LLM provider as private attribute
-        object.__setattr__(self, '_llm_provider', None)
+    def __post_init__(self):
+        # Resolve the shared LLM provider up front so its HTTP client is warm for the first query
+        self._llm_provider = LLMFactory.get_provider(self.llm_provider_name)
+        # Load the tokenizer at startup rather than on the first query
+        _get_encoding()
     
     def _get_llm_provider(self):
-        """Lazy initialization of LLM provider."""
-        if not hasattr(self, '_llm_provider') or self._llm_provider is None:
-            object.__setattr__(self, '_llm_provider', LLMFactory.create_provider(self.llm_provider_name))
+        """Get the process-wide LLM provider for this agent."""
         return self._llm_provider
     
     @log_agent_operation("process_query")
     async def process_query(self, context: AgentContext) -> QueryResponse:
         """Process a user query and return a response."""
-        try:
-            # Step 1: Search for relevant messages
-            with logfire.span("agent.search_phase") as search_span:
-                search_input = SearchToolInput(
-                    query_text=context.user_question,
-                    chat_id=context.telegram_chat_id,
-                    user_id=None,  # Search across all users in the chat
-                    debug=context.debug
-                )
-                search_span.set_attribute("search_input", search_input.model_dump())
-                
+        # Step 1: Search for relevant messages
+        with logfire.span("agent.search_phase") as search_span:
+            search_input = SearchToolInput(
+                query_text=context.user_question,
+                chat_id=context.telegram_chat_id,
+                user_id=None,  # Search across all users in the chat
+                debug=context.debug
+            )
+            search_span.set_attribute("search_input", search_input.model_dump_json())
+            
+            # Repeated questions reuse the cached search instead of another rewrite, embedding and lookup
+            query_cache = get_query_cache()
+            cache_key = query_cache.make_key(
+                search_input.query_text, self.database_url, search_input.chat_id, search_input.debug
+            )
+            search_result = query_cache.get(cache_key)
+            search_span.set_attribute("cache_hit", search_result is not None)
+            if search_result is None:
                 search_result = await get_search_tool(
                     database_url=self.database_url,
                     chroma_path=self.chroma_path,
                     expansion_db_url=f"sqlite:///{self.expansion_db_path}"
                 ).search_relevant_messages(search_input)
-                
-                search_span.set_attribute("messages_found", len(search_result.messages))
-            
-            if not search_result.messages:
-                return QueryResponse(
-                    answer_text="I couldn't find any relevant messages to answer your question.",
-                    source_messages=[],
-                    status="no_results"
-                )
+                # Empty results are not cached so a transient search failure is retried
+                if search_result.messages:
+                    query_cache.set(cache_key, search_result)
             
-            # Step 2: Prepare context for LLM
-            with logfire.span("agent.prepare_context") as context_span:
-                context_messages = search_result.messages[:self.max_context_messages]
-                context_span.set_attribute("context_message_count", len(context_messages))
-                
-                llm_prompt = self._create_llm_prompt(
-                    context.user_question,
-                    context_messages
-                )
+            search_span.set_attribute("messages_found", len(search_result.messages))
+        
+        if not search_result.messages or (
+            search_result.top_relevance_score is not None
+            and search_result.top_relevance_score < SETTINGS.min_relevance_score
+        ):
+            _no_results_counter().add(1)
+            return QueryResponse(
+                answer_text="I couldn't find any relevant messages to answer your question.",
+                source_messages=[],
+                status="no_results"
+            )
+        
+        # Step 2: Prepare context for LLM
+        with logfire.span("agent.prepare_context") as context_span:
+            llm_prompt = self._create_llm_prompt(
+                context.user_question,
+                search_result.messages[:self.max_context_messages]
+            )
+            # Only the messages that fit into the token budget are used as context
+            context_messages = llm_prompt.context_messages
+            context_span.set_attribute("context_message_count", len(context_messages))
+        
+        # Step 3: Generate response using LLM
+        with logfire.span("agent.llm_generation") as llm_span:
+            llm_span.set_attribute("llm_provider", self.llm_provider_name)
+            llm_span.set_attribute("temperature", 0.3)
             
-            # Step 3: Generate response using LLM
-            with logfire.span("agent.llm_generation") as llm_span:
-                llm_span.set_attribute("llm_provider", self.llm_provider_name)
-                llm_span.set_attribute("temperature", 0.3)
-                
+            try:
                 llm_response = await self._get_llm_provider().generate_response(
                     system_prompt=llm_prompt.system_prompt,
                     user_prompt=llm_prompt.user_prompt,
                     temperature=0.3  # Lower temperature for more factual responses
                 )
-            
-            # Step 4: Convert messages to API format
-            if context.debug and search_result.messages_with_scores:
-                # In debug mode, include expanded text and scores
-                source_messages = [
-                    SourceMessage(
-                        message_id=msg_with_score.message.message_id,
-                        sender=msg_with_score.message.sender_name,
-                        timestamp=msg_with_score.message.timestamp,
-                        text=msg_with_score.message.text,
-                        expanded_text=msg_with_score.expanded_text,
-                        relevance_score=msg_with_score.relevance_score
-                    )
-                    for msg_with_score in search_result.messages_with_scores[:self.max_context_messages]
-                ]
-            else:
-                # Normal mode
-                source_messages = [
-                    SourceMessage(
-                        message_id=msg.message_id,
-                        sender=msg.sender_name,
-                        timestamp=msg.timestamp,
-                        text=msg.text
-                    )
-                    for msg in context_messages
-                ]
-            
-            return QueryResponse(
-                answer_text=llm_response.content,
-                source_messages=source_messages,
-                status="success",
-                rewritten_query=search_result.rewritten_query if context.debug else None
-            )
-            
-        except Exception as e:
-            return QueryResponse(
-                answer_text=f"An error occurred while processing your query: {str(e)}",
-                source_messages=[],
-                status="error"
-            )
+            except (openai.APIError, anthropic.APIError, asyncio.TimeoutError) as e:
+                llm_span.set_attribute("error_type", type(e).__name__)
+                return QueryResponse(
+                    answer_text=f"An error occurred while generating the answer: {str(e)}",
+                    source_messages=[],
+                    status="error"
+                )
+        
+        # Step 4: Convert messages to API format
+        if context.debug and search_result.messages_with_scores:
+            # In debug mode, include expanded text and scores
+            source_messages = [
+                SourceMessage(
+                    message_id=msg_with_score.message.message_id,
+                    sender=msg_with_score.message.sender_name,
+                    timestamp=msg_with_score.message.timestamp,
+                    text=msg_with_score.message.text,
+                    expanded_text=msg_with_score.expanded_text,
+                    relevance_score=msg_with_score.relevance_score
+                )
+                for msg_with_score in search_result.messages_with_scores[:len(context_messages)]
+            ]
+        else:
+            # Normal mode
+            source_messages = [
+                SourceMessage(
+                    message_id=msg.message_id,
+                    sender=msg.sender_name,
+                    timestamp=msg.timestamp,
+                    text=msg.text
+                )
+                for msg in context_messages
+            ]
+        
+        return QueryResponse(
+            answer_text=llm_response.content,
+            source_messages=source_messages,
+            status="success",
+            rewritten_query=search_result.rewritten_query if context.debug else None
+        )
     
     def _create_llm_prompt(
         self,
@@ -130,33 +196,33 @@ class TelequeryAgent(BaseModel):
         context_messages: List[TelegramMessage]
     ) -> LLMPrompt:
         """Create a structured prompt for the LLM."""
+        # Format context messages, stopping once the token budget is exhausted
+        formatted_messages = []
+        used_tokens = 0
+        for msg in context_messages:
+            formatted = CONTEXT_MESSAGE_FORMAT.format(
+                sender=msg.sender_name,
+                time=msg.timestamp.isoformat(sep=' ', timespec='minutes'),
+                text=msg.text or ''
+            )
+            used_tokens += _count_tokens(formatted)
+            if formatted_messages and used_tokens > self.max_context_tokens:
+                break
+            formatted_messages.append(formatted)
         
-        system_prompt = """You are an AI assistant that helps users find information from their Telegram message history. 
-
-Your task is to:
-1. Analyze the provided message context carefully
-2. Answer the user's question based ONLY on the information in the messages
-3. Cite specific messages when possible by mentioning the sender and approximate time
-4. If you cannot find a clear answer in the messages, say so clearly
-5. Do not make up information or hallucinate responses
-
-Be concise but informative in your responses."""
-        
-        # Format context messages
-        context_text = "\n\n".join([
-            f"Message from {msg.sender_name} at {msg.timestamp.strftime('%Y-%m-%d %H:%M')}:\n{msg.text or ''}"
-            for msg in context_messages
-        ])
+        context_messages = context_messages[:len(formatted_messages)]
+        context_text = "\n\n".join(formatted_messages)
         
-        user_prompt = f"""Based on the following Telegram messages, please answer this question: "{user_question}"
-
-Message Context:
-{context_text}
-
-Please provide a clear, accurate answer based only on the information in these messages."""
+        user_prompt = "".join((
+            'Based on the following Telegram messages, please answer this question: "',
+            user_question,
+            '"\n\nMessage Context:\n',
+            context_text,
+            "\n\nPlease provide a clear, accurate answer based only on the information in these messages."
+        ))
         
         return LLMPrompt(
-            system_prompt=system_prompt,
+            system_prompt=SYSTEM_PROMPT,
             user_prompt=user_prompt,
             context_messages=context_messages
         )
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""In-process LRU cache of search results for repeated questions."""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple, Union
+
+# Maximum number of cached queries and how long a cached result stays valid
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "300"))
+
+
+def normalize_query(query_text: str) -> str:
+    """Normalize case and whitespace so trivially different questions share a cache entry."""
+    return " ".join(query_text.lower().split())
+
+
+class QueryCache:
+    """LRU cache with a TTL, keyed by normalized query text and search scope."""
+    
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, ttl_seconds: float = QUERY_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def make_key(query_text: str, *scope: Hashable) -> str:
+        """Build the cache key for a query within a scope (e.g. chat ID and debug flag)."""
+        return hashlib.sha256(repr((normalize_query(query_text),) + scope).encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def set(self, key: str, value: Any):
+        """Cache a value, evicting the least recently used entry when full."""
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Drop all cached entries."""
+        self._entries.clear()
+    
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Hit/miss counters for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+# Global cache instance
+_query_cache: Optional[QueryCache] = None
+
+
+def get_query_cache() -> QueryCache:
+    """Get or create the query cache instance."""
+    global _query_cache
+    
+    if _query_cache is None:
+        _query_cache = QueryCache()
+    return _query_cache
@@ -0,0 +1,42 @@
+"""Process-wide registry of ChromaDB clients and expansion DB engines.
+
+Opening a Chroma collection loads its HNSW index from disk, so every search tool and
+service in a process shares one client per path. With several uvicorn workers each
+worker still opens its own clients once.
+"""
+import os
+import threading
+from typing import Any, Dict, Hashable, Tuple
+
+# Disable ChromaDB telemetry before any imports
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+import chromadb
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+from ..database.pragmas import EXPANSION_WAL_AUTOCHECKPOINT, apply_sqlite_pragmas
+
+_CLIENTS: Dict[Tuple[str, Hashable], Any] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_chroma_client(path: str):
+    """Get the shared persistent ChromaDB client for a storage path."""
+    with _CLIENTS_LOCK:
+        key = ("chroma", path)
+        if key not in _CLIENTS:
+            _CLIENTS[key] = chromadb.PersistentClient(path=path)
+        return _CLIENTS[key]
+
+
+def get_expansion_engine(url: str) -> Engine:
+    """Get the shared, WAL-tuned engine for an expansion database URL."""
+    with _CLIENTS_LOCK:
+        key = ("expansion_engine", url)
+        if key not in _CLIENTS:
+            _CLIENTS[key] = apply_sqlite_pragmas(
+                create_engine(url, connect_args={"check_same_thread": False}),
+                wal_autocheckpoint=EXPANSION_WAL_AUTOCHECKPOINT
+            )
+        return _CLIENTS[key]
@@ -1,34 +1,57 @@
-import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
 
 from ..models.schema import Base
+from .pragmas import apply_sqlite_pragmas, run_if_schema_outdated
+from ..settings import SETTINGS
 
-# Handle database URL with support for MAIN_DB_PATH
-main_db_path = os.getenv("MAIN_DB_PATH")
-if main_db_path:
-    DATABASE_URL = f"sqlite:///{main_db_path}"
-else:
-    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///../telequery_db/telegram_messages.db")
+# Database URL resolved once by the settings module (supports MAIN_DB_PATH)
+DATABASE_URL = SETTINGS.database_url
 ASYNC_DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://")
 
+# Stored in PRAGMA user_version once the schema is created; bump when _create_schema changes
+SCHEMA_VERSION = 2
+
 # Synchronous engine for initial setup
-sync_engine = create_engine(DATABASE_URL, echo=False)
+sync_engine = apply_sqlite_pragmas(create_engine(
+    DATABASE_URL,
+    echo=False,
+    insertmanyvalues_page_size=10_000,
+    # SessionLocal is shared with worker threads
+    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
 
-# Asynchronous engine for FastAPI
-async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False)
-AsyncSessionLocal = sessionmaker(
-    bind=async_engine,
-    class_=AsyncSession,
-    expire_on_commit=False
+# Asynchronous engine for FastAPI (aiosqlite opens local files cheaply, so skip pooling)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=False,
+    poolclass=NullPool,
+    connect_args={"check_same_thread": False}
 )
+apply_sqlite_pragmas(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
 
 
 def create_tables():
-    """Create all database tables."""
+    """Create all database tables, skipping the work when the schema version is current."""
+    run_if_schema_outdated(sync_engine, SCHEMA_VERSION, _create_schema)
+
+
+def _create_schema():
     Base.metadata.create_all(bind=sync_engine)
+    
+    # create_all skips indexes on tables that already exist, so add newer ones explicitly
+    with sync_engine.begin() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_messages_chat_date ON messages (chat_id, telegram_date DESC)"
+        ))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_messages_text_date ON messages (telegram_date) "
+            "WHERE text IS NOT NULL AND text != ''"
+        ))
 
 
 async def get_async_session():
@@ -0,0 +1,54 @@
+"""SQLite connection tuning and schema versioning shared by all engines."""
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Applied on every new DBAPI connection: WAL lets readers run alongside the writer,
+# synchronous=NORMAL drops the per-commit fsync, and temp tables, a 64 MB page cache and mmap stay in memory.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -64000,
+    "mmap_size": 268435456,
+}
+
+# Pages between automatic WAL checkpoints for the append-mostly expansion database
+EXPANSION_WAL_AUTOCHECKPOINT = 10000
+
+
+def apply_sqlite_pragmas(engine: Engine, **overrides) -> Engine:
+    """Run the tuning PRAGMAs on each new connection of a SQLite engine."""
+    if engine.dialect.name != "sqlite":
+        return engine
+
+    pragmas = {**SQLITE_PRAGMAS, **overrides}
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return engine
+
+
+def run_if_schema_outdated(engine: Engine, version: int, create_schema: Callable[[], None]) -> bool:
+    """Run `create_schema` unless the SQLite database's `PRAGMA user_version` is already at `version`.
+    
+    Bump `version` whenever `create_schema` gains new tables or indexes. Non-SQLite engines always run it.
+    """
+    is_sqlite = engine.dialect.name == "sqlite"
+    if is_sqlite:
+        with engine.connect() as conn:
+            if conn.exec_driver_sql("PRAGMA user_version").scalar() >= version:
+                return False
+    
+    create_schema()
+    
+    if is_sqlite:
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"PRAGMA user_version={int(version)}")
+    return True
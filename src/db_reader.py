@@ -1,22 +1,60 @@
 import sqlite3
+import threading
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional, Union
 import argparse
 
+# Connections kept per thread and database, so SQLite's page cache survives between readers
+# while threads never interleave statements (or streamed cursors) on one connection
+_LOCAL = threading.local()
+
+# Applied once when a connection is first opened; the reader never writes to the database
+READER_PRAGMAS = (
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=536870912",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def _get_connection(db_path: str) -> sqlite3.Connection:
+    """Get this thread's connection to a database, opening and tuning it on first use."""
+    connections = getattr(_LOCAL, "connections", None)
+    if connections is None:
+        connections = _LOCAL.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, isolation_level=None, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        for pragma in READER_PRAGMAS:
+            conn.execute(pragma)
+        connections[db_path] = conn
+    return conn
+
+
+def _rows(cursor: sqlite3.Cursor, stream: bool) -> Union[List[Dict], Iterator[sqlite3.Row]]:
+    """Return rows as dicts, or lazily as sqlite3.Row objects when streaming."""
+    if stream:
+        return iter(cursor)
+    return [dict(row) for row in cursor]
+
 
 class TelegramDBReader:
     def __init__(self, db_path: str):
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
-        self.conn.row_factory = sqlite3.Row
+    
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The calling thread's cached connection, so a reader can be used from any thread."""
+        return _get_connection(self.db_path)
     
     def __enter__(self):
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.conn.close()
+        # The thread's connection stays open to keep its page cache warm
+        pass
     
-    def get_all_chats(self) -> List[Dict]:
+    def get_all_chats(self, stream: bool = False) -> Union[List[Dict], Iterator[sqlite3.Row]]:
         """Get all chats from the database."""
         cursor = self.conn.cursor()
         cursor.execute("""
@@ -25,9 +63,9 @@ class TelegramDBReader:
             FROM chats
             ORDER BY name
         """)
-        return [dict(row) for row in cursor.fetchall()]
+        return _rows(cursor, stream)
     
-    def get_messages_by_chat(self, chat_id: int, limit: int = 10) -> List[Dict]:
+    def get_messages_by_chat(self, chat_id: int, limit: int = 10, stream: bool = False) -> Union[List[Dict], Iterator[sqlite3.Row]]:
         """Get messages from a specific chat."""
         cursor = self.conn.cursor()
         cursor.execute("""
@@ -40,9 +78,9 @@ class TelegramDBReader:
             ORDER BY m.telegram_date DESC
             LIMIT ?
         """, (chat_id, limit))
-        return [dict(row) for row in cursor.fetchall()]
+        return _rows(cursor, stream)
     
-    def search_messages(self, search_term: str, limit: int = 20) -> List[Dict]:
+    def search_messages(self, search_term: str, limit: int = 20, stream: bool = False) -> Union[List[Dict], Iterator[sqlite3.Row]]:
         """Search messages by text content."""
         cursor = self.conn.cursor()
         cursor.execute("""
@@ -54,9 +92,9 @@ class TelegramDBReader:
             ORDER BY m.telegram_date DESC
             LIMIT ?
         """, (f'%{search_term}%', limit))
-        return [dict(row) for row in cursor.fetchall()]
+        return _rows(cursor, stream)
     
-    def get_messages_by_sender(self, sender_name: str, limit: int = 20) -> List[Dict]:
+    def get_messages_by_sender(self, sender_name: str, limit: int = 20, stream: bool = False) -> Union[List[Dict], Iterator[sqlite3.Row]]:
         """Get messages from a specific sender."""
         cursor = self.conn.cursor()
         cursor.execute("""
@@ -68,9 +106,9 @@ class TelegramDBReader:
             ORDER BY m.telegram_date DESC
             LIMIT ?
         """, (f'%{sender_name}%', limit))
-        return [dict(row) for row in cursor.fetchall()]
+        return _rows(cursor, stream)
     
-    def get_recent_messages(self, limit: int = 20) -> List[Dict]:
+    def get_recent_messages(self, limit: int = 20, stream: bool = False) -> Union[List[Dict], Iterator[sqlite3.Row]]:
         """Get most recent messages across all chats."""
         cursor = self.conn.cursor()
         cursor.execute("""
@@ -81,7 +119,7 @@ class TelegramDBReader:
             ORDER BY m.telegram_date DESC
             LIMIT ?
         """, (limit,))
-        return [dict(row) for row in cursor.fetchall()]
+        return _rows(cursor, stream)
     
     def get_database_stats(self) -> Dict:
         """Get statistics about the database."""
@@ -89,13 +127,21 @@ class TelegramDBReader:
         
         stats = {}
         
-        # Total messages
-        cursor.execute("SELECT COUNT(*) FROM messages")
-        stats['total_messages'] = cursor.fetchone()[0]
-        
-        # Total chats
-        cursor.execute("SELECT COUNT(*) FROM chats")
-        stats['total_chats'] = cursor.fetchone()[0]
+        # Totals and date range in a single statement
+        cursor.execute("""
+            SELECT COUNT(*) AS total_messages,
+                   (SELECT COUNT(*) FROM chats) AS total_chats,
+                   MIN(telegram_date) AS earliest,
+                   MAX(telegram_date) AS latest
+            FROM messages
+        """)
+        row = cursor.fetchone()
+        stats['total_messages'] = row['total_messages']
+        stats['total_chats'] = row['total_chats']
+        stats['date_range'] = {
+            'earliest': row['earliest'],
+            'latest': row['latest']
+        }
         
         # Messages by chat type
         cursor.execute("""
@@ -106,17 +152,6 @@ class TelegramDBReader:
         """)
         stats['messages_by_chat_type'] = {row[0]: row[1] for row in cursor.fetchall()}
         
-        # Date range
-        cursor.execute("""
-            SELECT MIN(telegram_date) as earliest, MAX(telegram_date) as latest
-            FROM messages
-        """)
-        row = cursor.fetchone()
-        stats['date_range'] = {
-            'earliest': row[0],
-            'latest': row[1]
-        }
-        
         # Top senders
         cursor.execute("""
             SELECT sender_name, COUNT(*) as count
@@ -131,9 +166,9 @@ class TelegramDBReader:
         return stats
 
 
-def format_message(msg: Dict) -> str:
-    """Format a message for display."""
-    date_str = msg.get('telegram_date', 'Unknown date')
+def format_message(msg: Union[Dict, sqlite3.Row]) -> str:
+    """Format a message (a dict or a streamed sqlite3.Row) for display."""
+    date_str = msg['telegram_date'] or 'Unknown date'
     try:
         # Attempt to parse the date string into a datetime object
         date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
@@ -141,9 +176,9 @@ def format_message(msg: Dict) -> str:
     except (ValueError, TypeError):
         date = date_str  # Fallback to original string if parsing fails
     
-    sender = msg.get('sender_name', 'Unknown sender')
-    chat = msg.get('chat_name', 'Unknown chat')
-    text = msg.get('text', '')
+    sender = msg['sender_name'] or 'Unknown sender'
+    chat = msg['chat_name'] or 'Unknown chat'
+    text = msg['text'] or ''
     
     # Truncate long messages
     if text and len(text) > 200:
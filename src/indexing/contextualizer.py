@@ -1,102 +1,47 @@
-import asyncio
-import json
-from typing import List, Dict, Any, Optional
+import operator
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 from sqlalchemy.orm import Session
 from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import logfire
+import orjson
 from ..models.database import TelegramMessage
 from ..models.schema import Message as SourceMessage
 from ..database.expansion_schema import MessageExpansion
 from ..llm.factory import LLMFactory, LLMProvider
 
+# Overlapping batches and context windows parse the same timestamps repeatedly
+@lru_cache(maxsize=8192)
 def _to_datetime(date_str: str) -> Optional[datetime]:
-    if not date_str:
-        return None
+    if not date_str or isinstance(date_str, datetime):
+        return date_str or None
     try:
-        # Handle different string formats, including ISO 8601
-        return datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+        # Handle different string formats, including ISO 8601; fromisoformat only accepts a
+        # trailing 'Z' from Python 3.11, so rewrite it only when it is actually there
+        if date_str[-1] == 'Z':
+            date_str = date_str[:-1] + '+00:00'
+        return datetime.fromisoformat(date_str)
     except (ValueError, TypeError):
         return None
 
-class MessageContextualizer:
-    def __init__(self, source_session: Session, expansion_session: Session):
-        self.source_session = source_session
-        self.expansion_session = expansion_session
-        self.llm_provider: LLMProvider = LLMFactory.create_provider()
 
-    def _get_batch_with_context(self, messages: List[SourceMessage], context_window: int = 10) -> List[SourceMessage]:
-        """Get messages with additional context before the batch for better expansions."""
-        if not messages:
-            return []
-        
-        # Get the earliest message in the batch
-        earliest_message = min(messages, key=lambda m: m.timestamp)
-        
-        # Get context messages before the batch using raw SQL
-        results = self.source_session.execute(
-            text("SELECT * FROM messages WHERE chat_id = :chat_id AND telegram_date < :telegram_date ORDER BY telegram_date DESC LIMIT :limit"),
-            {"chat_id": earliest_message.chat_id, "telegram_date": earliest_message.telegram_date, "limit": context_window}
-        ).fetchall()
-        
-        # Convert raw results to message objects
-        context_messages = []
-        for row in results:
-            msg = type('Message', (), {
-                'id': row[0],
-                'telegram_id': row[1],
-                'chat_id': row[2],
-                'text': row[3],
-                'message_type': row[4],
-                'sender_id': row[5],
-                'sender_name': row[6],
-                'sender_username': row[7],
-                'telegram_date': _to_datetime(row[8]),
-                'created_at': _to_datetime(row[9]),
-                'updated_at': _to_datetime(row[10]),
-                'is_outgoing': row[11],
-                'is_reply': row[12],
-                'reply_to_message_id': row[13],
-                'forward_from_id': row[14],
-                'forward_from_name': row[15],
-                'media_type': row[16],
-                'media_file_id': row[17],
-                'media_file_name': row[18],
-                'media_file_size': row[19],
-                # Add properties for compatibility
-                'message_id': str(row[1]),  # telegram_id
-                'timestamp': _to_datetime(row[8]),        # telegram_date
-                'user_id': str(row[5]) if row[5] else "unknown"  # sender_id
-            })()
-            context_messages.append(msg)
-        
-        # Combine context and batch messages, sorted chronologically
-        all_messages = list(reversed(context_messages)) + sorted(messages, key=lambda m: m.telegram_date)
-        return all_messages
+# Columns of the messages table read for expansion, in the order MessageRow reads them
+MESSAGE_COLUMNS = (
+    "id", "telegram_id", "chat_id", "text", "sender_id", "sender_name", "telegram_date",
+)
+MESSAGE_SELECT = ", ".join(MESSAGE_COLUMNS)
 
-    def _create_batch_expansion_prompt(self, batch_messages: List[SourceMessage], context_messages: List[SourceMessage]) -> str:
-        """Creates a prompt for expanding a batch of messages."""
-        
-        # Format all messages (context + batch) in the specified format
-        all_messages = context_messages + batch_messages
-        messages_str = ""
-        
-        for msg in all_messages:
-            messages_str += f"message_id: {msg.message_id}\n"
-            messages_str += f"author: {msg.sender_name}\n"
-            messages_str += f"original_text: {msg.text}\n"
-            messages_str += "---\n"
-        
-        # Create a list of message IDs to expand (only the batch messages, not context)
-        batch_ids = [msg.message_id for msg in batch_messages]
-        
-        prompt = f"""
+# Prompt frame for batch expansion; the chat chunk and the IDs to expand are filled in per batch
+BATCH_EXPANSION_PROMPT = """
 You are processing a chat chunk of Telegram messages to make them searchable. You will be given a conversation with multiple messages and need to expand specific messages to be self-contained by incorporating relevant context from the conversation.
 
 Here is the chat chunk:
 
-{messages_str}
+{messages}
 
-Expand the following message IDs to include all necessary context so they can be understood standalone: {', '.join(batch_ids)}
+Expand the following message IDs to include all necessary context so they can be understood standalone: {ids}
 
 Rules:
 1. Only use information from the provided conversation
@@ -116,22 +61,171 @@ Return your response as a JSON object with this exact structure:
   ]
 }}
 
-Only include expansions for the specified message IDs. Ensure the JSON is valid.
+Only include expansions for the specified message IDs.
 """
-        return prompt
 
-    async def expand_batch_and_save(self, batch_messages: List[SourceMessage]):
-        """Process a batch of messages and save their expansions."""
+# Structured output schema for batch expansion responses
+EXPANSION_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "message_expansions",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "expansions": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "message_id": {"type": "string"},
+                            "original_text": {"type": "string"},
+                            "expanded_text": {"type": "string"}
+                        },
+                        "required": ["message_id", "original_text", "expanded_text"],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["expansions"],
+            "additionalProperties": False
+        }
+    }
+}
+
+# Context windows fetched per statement, keeping the bound parameters well under SQLite's limit
+CONTEXT_QUERY_CHUNK_SIZE = 500
+
+
+class MessageRow:
+    """A messages row read with raw SQL, with the same compatibility properties as the ORM model."""
+    
+    __slots__ = MESSAGE_COLUMNS + ("message_id", "timestamp", "user_id")
+    
+    def __init__(self, id, telegram_id, chat_id, text, sender_id, sender_name, telegram_date):
+        # Positional in MESSAGE_COLUMNS order, so rows are unpacked directly instead of looked up by name
+        self.id = id
+        self.telegram_id = telegram_id
+        self.chat_id = chat_id
+        self.text = text
+        self.sender_id = sender_id
+        self.sender_name = sender_name
+        self.telegram_date = _to_datetime(telegram_date)
+        # Add properties for compatibility
+        self.message_id = str(self.telegram_id)
+        self.timestamp = self.telegram_date
+        self.user_id = str(self.sender_id) if self.sender_id else "unknown"
+
+
+class MessageContextualizer:
+    def __init__(self, source_session: Session, expansion_session: Session):
+        self.source_session = source_session
+        self.expansion_session = expansion_session
+        self.llm_provider: LLMProvider = LLMFactory.get_provider()
+
+    @staticmethod
+    def _valid_messages(batch_messages: List[SourceMessage]) -> List[SourceMessage]:
+        """Messages of a batch that have text to expand."""
+        return [msg for msg in batch_messages if msg.text and msg.text.strip()]
+
+    @staticmethod
+    def _context_key(messages: List[SourceMessage]) -> Tuple[Any, Any]:
+        """Identify a batch's context window by the chat and date of its earliest message."""
+        earliest_message = min(messages, key=operator.attrgetter("telegram_date"))
+        return earliest_message.chat_id, earliest_message.telegram_date
+
+    def _get_batches_with_context(
+        self,
+        batches: List[List[SourceMessage]],
+        context_window: int = 10
+    ) -> Dict[Tuple[Any, Any], List[MessageRow]]:
+        """Fetch the context messages preceding every batch, oldest first, in a single windowed query per chunk of batches."""
+        keys = list({self._context_key(valid) for valid in map(self._valid_messages, batches) if valid})
+        windows: Dict[Tuple[Any, Any], List[MessageRow]] = {key: [] for key in keys}
+        
+        for chunk_start in range(0, len(keys), CONTEXT_QUERY_CHUNK_SIZE):
+            chunk = keys[chunk_start:chunk_start + CONTEXT_QUERY_CHUNK_SIZE]
+            values = ", ".join(f"(:w{i}, :c{i}, :t{i})" for i in range(len(chunk)))
+            params = {"limit": context_window}
+            for i, (chat_id, telegram_date) in enumerate(chunk):
+                params[f"w{i}"] = i
+                params[f"c{i}"] = chat_id
+                params[f"t{i}"] = telegram_date
+            
+            results = self.source_session.execute(
+                text(f"""
+                    WITH earliest(window_id, chat_id, telegram_date) AS (VALUES {values})
+                    SELECT * FROM (
+                        SELECT e.window_id, {", ".join(f"m.{column}" for column in MESSAGE_COLUMNS)},
+                               ROW_NUMBER() OVER (PARTITION BY e.window_id ORDER BY m.telegram_date DESC) AS rn
+                        FROM messages m
+                        JOIN earliest e ON m.chat_id = e.chat_id AND m.telegram_date < e.telegram_date
+                    )
+                    WHERE rn <= :limit
+                    ORDER BY window_id, telegram_date ASC
+                """),
+                params
+            ).fetchall()
+            
+            for row in results:
+                windows[chunk[row[0]]].append(MessageRow(*row[1:-1]))
+        
+        return windows
+
+    def _get_batch_with_context(
+        self,
+        messages: List[SourceMessage],
+        context_window: int = 10,
+        context_windows: Optional[Dict[Tuple[Any, Any], List[MessageRow]]] = None
+    ) -> List[SourceMessage]:
+        """Get messages with additional context before the batch for better expansions."""
+        if not messages:
+            return []
+        
+        batch_sorted = sorted(messages, key=operator.attrgetter("telegram_date"))
+        earliest_message = batch_sorted[0]
+        
+        # Use prefetched context windows when available, otherwise query this batch's window
+        if context_windows is None:
+            context_windows = self._get_batches_with_context([batch_sorted], context_window)
+        context_messages = context_windows.get((earliest_message.chat_id, earliest_message.telegram_date), [])
+        
+        # Combine context and batch messages, sorted chronologically
+        return context_messages + batch_sorted
+
+    def _create_batch_expansion_prompt(self, batch_messages: List[SourceMessage], context_messages: List[SourceMessage]) -> str:
+        """Creates a prompt for expanding a batch of messages."""
+        
+        # Format all messages (context + batch) in the specified format
+        parts = []
+        append = parts.append
+        for msg in context_messages + batch_messages:
+            append(f"message_id: {msg.message_id}\nauthor: {msg.sender_name}\noriginal_text: {msg.text}\n---\n")
+        
+        # Create a list of message IDs to expand (only the batch messages, not context)
+        batch_ids = [msg.message_id for msg in batch_messages]
+        
+        return BATCH_EXPANSION_PROMPT.format(messages="".join(parts), ids=", ".join(batch_ids))
+
+    async def expand_batch(
+        self,
+        batch_messages: List[SourceMessage],
+        context_windows: Optional[Dict[Tuple[Any, Any], List[MessageRow]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Expand a batch of messages and return expansion rows without writing them.
+        
+        `context_windows` can hold windows prefetched with `_get_batches_with_context`.
+        """
         if not batch_messages:
-            return 0
+            return []
         
         # Filter out messages without text
-        valid_messages = [msg for msg in batch_messages if msg.text and msg.text.strip()]
+        valid_messages = self._valid_messages(batch_messages)
         if not valid_messages:
-            return 0
+            return []
         
         # Get context for the batch
-        context_messages = self._get_batch_with_context(valid_messages)
+        context_messages = self._get_batch_with_context(valid_messages, context_windows=context_windows)
         
         # Create the batch expansion prompt
         user_prompt = self._create_batch_expansion_prompt(valid_messages, context_messages)
@@ -143,90 +237,64 @@ Only include expansions for the specified message IDs. Ensure the JSON is valid.
             response = await self.llm_provider.generate_response(
                 system_prompt=system_prompt,
                 user_prompt=user_prompt,
-                temperature=0.1
+                temperature=0.1,
+                response_format=EXPANSION_RESPONSE_FORMAT
             )
             
-            # Parse JSON response
-            try:
-                expansions_data = json.loads(response.content)
-                expansions = expansions_data.get("expansions", [])
-            except json.JSONDecodeError as e:
-                print(f"❌ JSON parsing error: {e}")
-                print(f"Response content: {response.content[:500]}...")
-                return 0
+            # The response format guarantees JSON matching the schema
+            expansions = orjson.loads(response.content)["expansions"]
             
-            # Save expansions to database
-            saved_count = 0
+            created_at = datetime.utcnow()
+            rows = []
             for expansion_data in expansions:
                 try:
-                    message_id = str(expansion_data["message_id"])
-                    
-                    # Check if expansion already exists
-                    existing = self.expansion_session.query(MessageExpansion).filter_by(
-                        message_id=message_id
-                    ).first()
-                    
-                    if existing:
-                        # Skip if already exists
-                        continue
-                    
-                    expansion = MessageExpansion(
-                        message_id=message_id,
-                        expanded_text=expansion_data["expanded_text"],
-                        model_used=response.model
-                    )
-                    self.expansion_session.add(expansion)
-                    saved_count += 1
+                    rows.append({
+                        "message_id": str(expansion_data["message_id"]),
+                        "expanded_text": expansion_data["expanded_text"],
+                        "model_used": response.model,
+                        "created_at": created_at
+                    })
                 except Exception as e:
-                    print(f"❌ Error saving expansion for {expansion_data.get('message_id', 'unknown')}: {e}")
+                    logfire.warn(
+                        "skipping invalid expansion for {message_id}: {error}",
+                        message_id=expansion_data.get("message_id", "unknown"),
+                        error=str(e)
+                    )
                     continue
             
-            # Commit all expansions
-            self.expansion_session.commit()
-            return saved_count
+            return rows
             
-        except Exception as e:
-            print(f"❌ Error processing batch: {e}")
+        except Exception:
+            logfire.exception("expansion batch failed", batch_size=len(valid_messages))
+            return []
+
+    def save_expansions(self, rows: List[Dict[str, Any]]) -> int:
+        """Insert expansion rows in one statement, skipping already-expanded messages, and commit once."""
+        if not rows:
             return 0
+        
+        result = self.expansion_session.execute(
+            sqlite_insert(MessageExpansion.__table__).on_conflict_do_nothing(index_elements=["message_id"]),
+            rows
+        )
+        self.expansion_session.commit()
+        return result.rowcount
+
+    async def expand_batch_and_save(self, batch_messages: List[SourceMessage]):
+        """Process a batch of messages and save their expansions."""
+        rows = await self.expand_batch(batch_messages)
+        return self.save_expansions(rows)
 
     # Keep the old method for backward compatibility
     async def expand_and_save_message(self, message: TelegramMessage):
         """Legacy method - now uses batch processing with single message."""
         # Convert to SourceMessage for batch processing using raw SQL
         result = self.source_session.execute(
-            text("SELECT * FROM messages WHERE telegram_id = :telegram_id"),
+            text(f"SELECT {MESSAGE_SELECT} FROM messages WHERE telegram_id = :telegram_id"),
             {"telegram_id": int(message.message_id)}
         ).fetchone()
         
-        if result:
-            source_message = type('Message', (), {
-                'id': result[0],
-                'telegram_id': result[1],
-                'chat_id': result[2],
-                'text': result[3],
-                'message_type': result[4],
-                'sender_id': result[5],
-                'sender_name': result[6],
-                'sender_username': result[7],
-                'telegram_date': _to_datetime(result[8]),
-                'created_at': _to_datetime(result[9]),
-                'updated_at': _to_datetime(result[10]),
-                'is_outgoing': result[11],
-                'is_reply': result[12],
-                'reply_to_message_id': result[13],
-                'forward_from_id': result[14],
-                'forward_from_name': result[15],
-                'media_type': result[16],
-                'media_file_id': result[17],
-                'media_file_name': result[18],
-                'media_file_size': result[19],
-                # Add properties for compatibility
-                'message_id': str(result[1]),  # telegram_id
-                'timestamp': _to_datetime(result[8]),        # telegram_date
-                'user_id': str(result[5]) if result[5] else "unknown"  # sender_id
-            })()
-        else:
-            source_message = None
+        source_message = MessageRow(*result) if result else None
         
         if source_message:
             await self.expand_batch_and_save([source_message])
\ No newline at end of file
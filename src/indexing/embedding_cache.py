@@ -0,0 +1,47 @@
+"""On-disk cache of document embeddings, keyed by a hash of the model and the text.
+
+Repeated texts (greetings, forwards, canned replies) and messages re-indexed after a rebuild
+are embedded once and read back from SQLite afterwards instead of being sent to OpenAI again.
+"""
+import hashlib
+import json
+import sqlite3
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+
+class EmbeddingCache:
+    """SQLite-backed map from (model, text) to its embedding vector, stored as float32 bytes."""
+    
+    def __init__(self, path: str, model_name: str):
+        self.model_name = model_name
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL) WITHOUT ROWID"
+        )
+    
+    def _key(self, text: str) -> str:
+        return hashlib.blake2b(f"{self.model_name}\0{text}".encode(), digest_size=16).hexdigest()
+    
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Get the cached vector of each text, or None where it has not been embedded yet."""
+        keys = [self._key(text) for text in texts]
+        rows = self.connection.execute(
+            "SELECT key, vector FROM embeddings WHERE key IN (SELECT value FROM json_each(?))",
+            (json.dumps(keys),)
+        )
+        vectors: Dict[str, List[float]] = {key: array("f", vector).tolist() for key, vector in rows}
+        return [vectors.get(key) for key in keys]
+    
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """Store the vectors of freshly embedded texts."""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector) VALUES (?, ?)",
+                ((self._key(text), array("f", vector).tobytes()) for text, vector in zip(texts, vectors))
+            )
+    
+    def close(self):
+        self.connection.close()
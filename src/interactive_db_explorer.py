@@ -1,14 +1,416 @@
 #!/usr/bin/env python3
+import argparse
+import asyncio
+import os
 import sqlite3
 import sys
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
+from collections import namedtuple
 from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+# Characters of formatted output gathered before each write in export_messages
+EXPORT_CHUNK_SIZE = 65536
+
+# Rows pulled from SQLite per fetch while exporting
+EXPORT_FETCH_SIZE = 1000
+
+# Applied on the read-only browsing connection: scans and exports are served
+# from a 256 MB memory map and a 128 MB page cache
+EXPLORER_PRAGMAS = (
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-131072",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Statements are kept as module constants so every call hands sqlite3 the same SQL
+# string and hits its prepared-statement cache instead of re-parsing the query
+_SQL_COUNTS = """
+    SELECT total_messages, (SELECT COUNT(*) FROM chats), min_date, max_date 
+    FROM global_stats
+"""
+
+_SQL_COUNTS_SCAN = """
+    SELECT COUNT(*), (SELECT COUNT(*) FROM chats), MIN(telegram_date), MAX(telegram_date) 
+    FROM messages
+"""
+
+_SQL_TOP_SENDERS = """
+    SELECT sender_name, cnt as count 
+    FROM sender_counts 
+    ORDER BY cnt DESC 
+    LIMIT 5
+"""
+
+_SQL_TOP_SENDERS_SCAN = """
+    SELECT sender_name, COUNT(*) as count 
+    FROM messages 
+    WHERE sender_name IS NOT NULL 
+    GROUP BY sender_name 
+    ORDER BY count DESC 
+    LIMIT 5
+"""
+
+_SQL_CHATS = """
+    SELECT c.id, c.name, c.chat_type, c.username, COALESCE(cc.cnt, 0) as message_count 
+    FROM chats c 
+    LEFT JOIN chat_message_counts cc ON cc.chat_id = c.id 
+    ORDER BY c.name
+"""
+
+_SQL_CHATS_SCAN = """
+    SELECT c.id, c.name, c.chat_type, c.username, COUNT(m.id) as message_count 
+    FROM chats c 
+    LEFT JOIN messages m ON m.chat_id = c.id 
+    GROUP BY c.id 
+    ORDER BY c.name
+"""
+
+_SQL_RECENT = """
+    SELECT m.*, c.name as chat_name 
+    FROM messages m 
+    JOIN chats c ON m.chat_id = c.id 
+    ORDER BY m.telegram_date DESC 
+    LIMIT ?
+"""
+
+_SQL_TEXT_SEARCH = """
+    SELECT m.*, c.name as chat_name 
+    FROM messages_fts 
+    JOIN messages m ON m.id = messages_fts.rowid 
+    JOIN chats c ON m.chat_id = c.id 
+    WHERE messages_fts MATCH ? 
+    ORDER BY bm25(messages_fts) 
+    LIMIT 50
+"""
+
+_SQL_TEXT_LIKE = """
+    SELECT m.*, c.name as chat_name 
+    FROM messages m 
+    JOIN chats c ON m.chat_id = c.id 
+    WHERE m.text LIKE ? ESCAPE '\\' 
+    ORDER BY m.telegram_date DESC 
+    LIMIT 50
+"""
+
+_SQL_SENDER_RANGE = """
+    SELECT m.*, c.name as chat_name 
+    FROM messages m 
+    JOIN chats c ON m.chat_id = c.id 
+    WHERE m.sender_name COLLATE NOCASE >= ? AND m.sender_name COLLATE NOCASE < ? 
+    ORDER BY m.telegram_date DESC 
+    LIMIT 50
+"""
+
+_SQL_SENDER_FROM = """
+    SELECT m.*, c.name as chat_name 
+    FROM messages m 
+    JOIN chats c ON m.chat_id = c.id 
+    WHERE m.sender_name COLLATE NOCASE >= ? 
+    ORDER BY m.telegram_date DESC 
+    LIMIT 50
+"""
+
+_SQL_SENDER_LIKE = """
+    SELECT m.*, c.name as chat_name 
+    FROM messages m 
+    JOIN chats c ON m.chat_id = c.id 
+    WHERE m.sender_name LIKE ? ESCAPE '\\' 
+    ORDER BY m.telegram_date DESC 
+    LIMIT 50
+"""
+
+_SQL_CHAT_MESSAGES = """
+    SELECT m.*, c.name as chat_name 
+    FROM messages m 
+    JOIN chats c ON m.chat_id = c.id 
+    WHERE m.chat_id = ? 
+    ORDER BY m.telegram_date DESC 
+    LIMIT 50
+"""
+
+_SQL_EXPORT = """
+    SELECT m.telegram_date, c.name as chat_name, m.sender_name, m.text 
+    FROM messages m 
+    JOIN chats c ON m.chat_id = c.id 
+    ORDER BY m.telegram_date
+"""
+
+# Lookups planned on the close-time connection so PRAGMA optimize covers the tables browsing used
+_OPTIMIZE_PLANS = (
+    (_SQL_RECENT, (0,)),
+    (_SQL_SENDER_RANGE, ('', '')),
+    (_SQL_CHAT_MESSAGES, (0,)),
+)
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query matching every word as a prefix."""
+    return " ".join('"' + token.replace('"', '""') + '"*' for token in text.split())
+
+
+def escape_like(text: str) -> str:
+    """Escape LIKE wildcards so `text` matches literally under `ESCAPE '\\'`."""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    """Smallest string greater than every string starting with `prefix` (None if there is none)."""
+    if ord(prefix[-1]) >= sys.maxunicode:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+@lru_cache(maxsize=32)
+def _row_type(fields: Tuple[str, ...]):
+    return namedtuple('MessageRow', fields, rename=True)
+
+
+def rows_as_namedtuples(cursor: sqlite3.Cursor) -> list:
+    """Fetch the rest of a plain-tuple cursor as namedtuples of one type built from its description."""
+    row_type = _row_type(tuple(column[0] for column in cursor.description))
+    return list(map(row_type._make, cursor))
+
+
+def format_display_message(msg) -> str:
+    """Format one message row for the terminal, truncating long text to 150 characters."""
+    text = msg.text or '[No text]'
+    if len(text) > 150:
+        text = text[:150] + '...'
+    media = f"[Media: {msg.media_type}]\n" if msg.media_type else ""
+    return f"\n[{msg.telegram_date}] {msg.chat_name}\n{msg.sender_name or 'Unknown'}: {text}\n{media}"
+
+
+# Bytes read from stdin past the end of the line read_line returned
+_stdin_pending = bytearray()
+
+
+async def read_line(prompt: str = "") -> str:
+    """input() for the event loop: waits for stdin with loop.add_reader rather than in a worker thread.
+    
+    A thread blocked in input() would keep asyncio.run waiting on shutdown, so Ctrl-C at a
+    prompt would not end the program until another line arrived.
+    """
+    sys.stdout.write(prompt)
+    sys.stdout.flush()
+    loop = asyncio.get_running_loop()
+    fd = sys.stdin.fileno()
+    while b"\n" not in _stdin_pending:
+        ready = loop.create_future()
+        try:
+            loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+        except (NotImplementedError, PermissionError):
+            # The loop cannot poll this stdin (Windows, or a regular file, which never blocks)
+            pass
+        else:
+            try:
+                await ready
+            finally:
+                loop.remove_reader(fd)
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            if not _stdin_pending:
+                raise EOFError
+            break
+        _stdin_pending.extend(chunk)
+    line, _, rest = bytes(_stdin_pending).partition(b"\n")
+    _stdin_pending[:] = rest
+    return line.decode(sys.stdin.encoding or "utf-8", errors="replace").rstrip("\r")
+
 
 class InteractiveTelegramExplorer:
-    def __init__(self, db_path: str = "tmp/telegram_messages.db"):
+    def __init__(self, db_path: str = "tmp/telegram_messages.db", immutable: bool = False, prepare: bool = False):
+        """Browse the database over a read-only connection.
+        
+        Pass `prepare=True` (`--prepare`) to first create the explorer's indexes, FTS table and
+        aggregates; this writes to the database, so it is opt-in and skipped if the file is read-only.
+        Pass `immutable=True` only when nothing writes the database while exploring;
+        SQLite then skips locking and change detection entirely.
+        """
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
+        self.immutable = immutable
+        self.prepared = False
+        if prepare:
+            try:
+                self._prepare_database()
+                self.prepared = True
+            except sqlite3.OperationalError as e:
+                print(f"⚠️ Could not prepare the database ({e}); browsing read-only without it")
+        
+        # Menu actions run in worker threads (see run), one at a time
+        mode = "ro&immutable=1" if immutable else "ro"
+        self.conn = sqlite3.connect(
+            f"{Path(db_path).resolve().as_uri()}?mode={mode}", uri=True, check_same_thread=False
+        )
         self.conn.row_factory = sqlite3.Row
+        for pragma in EXPLORER_PRAGMAS:
+            self.conn.execute(pragma)
+        self.cursor = self.conn.cursor()
+        # Message listings skip sqlite3.Row and are read as namedtuples (see rows_as_namedtuples)
+        self.message_cursor = self.conn.cursor()
+        self.message_cursor.row_factory = None
+        
+        # Without a prepared database, stats and search fall back to scanning messages directly
+        tables = {name for (name,) in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.has_fts = 'messages_fts' in tables
+        self.has_aggregates = {'sender_counts', 'chat_message_counts', 'global_stats'} <= tables
+        
+    def _prepare_database(self):
+        """Create the explorer's indexes, FTS table and aggregates over a short-lived writable connection."""
+        self.conn = sqlite3.connect(self.db_path)
+        try:
+            # WAL is persistent, so the ingester never blocks the read-only connection
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self._ensure_indexes()
+            self._ensure_fts()
+            self._ensure_aggregates()
+            self._ensure_stats()
+        finally:
+            self.conn.close()
+        
+    def _ensure_indexes(self):
+        """Create the B-tree indexes used by the explorer's lookups."""
+        self.conn.executescript("""
+            CREATE INDEX IF NOT EXISTS idx_sender_nocase ON messages(sender_name COLLATE NOCASE);
+            CREATE INDEX IF NOT EXISTS ix_messages_chat_date ON messages(chat_id, telegram_date DESC);
+            CREATE INDEX IF NOT EXISTS ix_messages_telegram_date ON messages(telegram_date);
+            CREATE INDEX IF NOT EXISTS idx_sender_nn ON messages(sender_name) WHERE sender_name IS NOT NULL;
+            -- Superseded by messages_fts; dropped where an earlier version created it
+            DROP INDEX IF EXISTS idx_messages_text;
+        """)
+        
+    def _ensure_fts(self):
+        """Create the messages_fts full-text index and its sync triggers on first use."""
+        exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        ).fetchone()
+        if exists:
+            return
+        
+        print("Building full-text search index (one-time)...")
+        self.conn.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                text, content=messages, content_rowid=id, tokenize="unicode61 remove_diacritics 2"
+            );
+            CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF text ON messages BEGIN
+                INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+                INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+            END;
+            INSERT INTO messages_fts(messages_fts) VALUES ('rebuild');
+        """)
+        self.conn.commit()
+        
+    def _ensure_aggregates(self):
+        """Create the trigger-maintained aggregate tables read by get_stats and list_chats."""
+        self._create_once('sender_counts', """
+            CREATE TABLE IF NOT EXISTS sender_counts(
+                sender_name TEXT PRIMARY KEY, cnt INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_sender_counts_cnt ON sender_counts(cnt DESC);
+            INSERT INTO sender_counts(sender_name, cnt) 
+                SELECT sender_name, COUNT(*) FROM messages WHERE sender_name IS NOT NULL GROUP BY sender_name;
+            CREATE TRIGGER IF NOT EXISTS sender_counts_ai AFTER INSERT ON messages 
+            WHEN new.sender_name IS NOT NULL BEGIN
+                INSERT INTO sender_counts(sender_name, cnt) VALUES (new.sender_name, 1) 
+                    ON CONFLICT(sender_name) DO UPDATE SET cnt = cnt + 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS sender_counts_ad AFTER DELETE ON messages 
+            WHEN old.sender_name IS NOT NULL BEGIN
+                UPDATE sender_counts SET cnt = cnt - 1 WHERE sender_name = old.sender_name;
+                DELETE FROM sender_counts WHERE sender_name = old.sender_name AND cnt <= 0;
+            END;
+            CREATE TRIGGER IF NOT EXISTS sender_counts_au AFTER UPDATE OF sender_name ON messages BEGIN
+                UPDATE sender_counts SET cnt = cnt - 1 WHERE sender_name = old.sender_name;
+                DELETE FROM sender_counts WHERE sender_name = old.sender_name AND cnt <= 0;
+                INSERT INTO sender_counts(sender_name, cnt) SELECT new.sender_name, 1 
+                    WHERE new.sender_name IS NOT NULL 
+                    ON CONFLICT(sender_name) DO UPDATE SET cnt = cnt + 1;
+            END;
+        """)
+        
+        self._create_once('chat_message_counts', """
+            CREATE TABLE IF NOT EXISTS chat_message_counts(
+                chat_id INTEGER PRIMARY KEY, cnt INTEGER NOT NULL
+            );
+            INSERT INTO chat_message_counts(chat_id, cnt) 
+                SELECT chat_id, COUNT(*) FROM messages GROUP BY chat_id;
+            CREATE TRIGGER IF NOT EXISTS chat_message_counts_ai AFTER INSERT ON messages BEGIN
+                INSERT INTO chat_message_counts(chat_id, cnt) VALUES (new.chat_id, 1) 
+                    ON CONFLICT(chat_id) DO UPDATE SET cnt = cnt + 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS chat_message_counts_ad AFTER DELETE ON messages BEGIN
+                UPDATE chat_message_counts SET cnt = cnt - 1 WHERE chat_id = old.chat_id;
+            END;
+            CREATE TRIGGER IF NOT EXISTS chat_message_counts_au AFTER UPDATE OF chat_id ON messages BEGIN
+                UPDATE chat_message_counts SET cnt = cnt - 1 WHERE chat_id = old.chat_id;
+                INSERT INTO chat_message_counts(chat_id, cnt) VALUES (new.chat_id, 1) 
+                    ON CONFLICT(chat_id) DO UPDATE SET cnt = cnt + 1;
+            END;
+        """)
+        
+        # Single row; MIN/MAX after a delete or date change are index seeks on ix_messages_telegram_date
+        self._create_once('global_stats', """
+            CREATE TABLE IF NOT EXISTS global_stats(
+                id INTEGER PRIMARY KEY CHECK (id = 1), 
+                total_messages INTEGER NOT NULL, 
+                min_date, 
+                max_date
+            );
+            INSERT INTO global_stats(id, total_messages, min_date, max_date) 
+                SELECT 1, COUNT(*), MIN(telegram_date), MAX(telegram_date) FROM messages;
+            CREATE TRIGGER IF NOT EXISTS global_stats_ai AFTER INSERT ON messages BEGIN
+                UPDATE global_stats SET 
+                    total_messages = total_messages + 1, 
+                    min_date = COALESCE(MIN(min_date, new.telegram_date), new.telegram_date), 
+                    max_date = COALESCE(MAX(max_date, new.telegram_date), new.telegram_date) 
+                WHERE id = 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS global_stats_ad AFTER DELETE ON messages BEGIN
+                UPDATE global_stats SET 
+                    total_messages = total_messages - 1, 
+                    min_date = (SELECT MIN(telegram_date) FROM messages), 
+                    max_date = (SELECT MAX(telegram_date) FROM messages) 
+                WHERE id = 1;
+            END;
+            CREATE TRIGGER IF NOT EXISTS global_stats_au AFTER UPDATE OF telegram_date ON messages BEGIN
+                UPDATE global_stats SET 
+                    min_date = (SELECT MIN(telegram_date) FROM messages), 
+                    max_date = (SELECT MAX(telegram_date) FROM messages) 
+                WHERE id = 1;
+            END;
+        """)
+        
+    def _create_once(self, table: str, script: str):
+        """Run `script` in one transaction unless `table` already exists."""
+        exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        if not exists:
+            self.conn.executescript(f"BEGIN; {script} COMMIT;")
+        
+    def _ensure_stats(self):
+        """Run ANALYZE when any messages/chats index has no planner statistics yet."""
+        has_stats = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+        ).fetchone()
+        if has_stats:
+            missing = self.conn.execute("""
+                SELECT 1 FROM sqlite_master 
+                WHERE type = 'index' AND tbl_name IN ('messages', 'chats') 
+                  AND name NOT IN (SELECT idx FROM sqlite_stat1 WHERE idx IS NOT NULL) 
+                LIMIT 1
+            """).fetchone()
+            if not missing:
+                return
+        
+        self.conn.executescript("ANALYZE messages; ANALYZE chats;")
         
     def show_menu(self):
         print("\n" + "="*60)
@@ -25,29 +427,14 @@ class InteractiveTelegramExplorer:
         print("-"*60)
         
     def get_stats(self):
-        cursor = self.conn.cursor()
-        
-        # Total counts
-        cursor.execute("SELECT COUNT(*) FROM messages")
-        total_messages = cursor.fetchone()[0]
+        cursor = self.cursor
         
-        cursor.execute("SELECT COUNT(*) FROM chats")
-        total_chats = cursor.fetchone()[0]
-        
-        # Date range
-        cursor.execute("SELECT MIN(telegram_date), MAX(telegram_date) FROM messages")
-        date_range = cursor.fetchone()
+        # Totals and date range in a single statement
+        counts_sql = _SQL_COUNTS if self.has_aggregates else _SQL_COUNTS_SCAN
+        total_messages, total_chats, *date_range = cursor.execute(counts_sql).fetchone()
         
         # Top senders
-        cursor.execute("""
-            SELECT sender_name, COUNT(*) as count 
-            FROM messages 
-            WHERE sender_name IS NOT NULL 
-            GROUP BY sender_name 
-            ORDER BY count DESC 
-            LIMIT 5
-        """)
-        top_senders = cursor.fetchall()
+        top_senders = cursor.execute(_SQL_TOP_SENDERS if self.has_aggregates else _SQL_TOP_SENDERS_SCAN).fetchall()
         
         print(f"\nTotal messages: {total_messages:,}")
         print(f"Total chats: {total_chats}")
@@ -57,161 +444,194 @@ class InteractiveTelegramExplorer:
             print(f"  - {sender['sender_name']}: {sender['count']:,} messages")
             
     def list_chats(self):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT id, name, chat_type, username FROM chats ORDER BY name")
-        chats = cursor.fetchall()
+        chats = self.cursor.execute(_SQL_CHATS if self.has_aggregates else _SQL_CHATS_SCAN).fetchall()
         
         print(f"\nFound {len(chats)} chats:")
         for chat in chats:
             username = f" (@{chat['username']})" if chat['username'] else ""
-            print(f"  [{chat['id']}] {chat['name']}{username} - {chat['chat_type']}")
+            print(f"  [{chat['id']}] {chat['name']}{username} - {chat['chat_type']} ({chat['message_count']:,} messages)")
             
-    def show_recent_messages(self):
-        count = input("\nHow many recent messages to show? (default: 10): ").strip()
-        count = int(count) if count else 10
-        
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT m.*, c.name as chat_name 
-            FROM messages m 
-            JOIN chats c ON m.chat_id = c.id 
-            ORDER BY m.telegram_date DESC 
-            LIMIT ?
-        """, (count,))
-        
-        self._display_messages(cursor.fetchall())
-        
-    def search_by_text(self):
-        query = input("\nEnter search text: ").strip()
-        if not query:
-            print("No search query provided.")
-            return
-            
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT m.*, c.name as chat_name 
-            FROM messages m 
-            JOIN chats c ON m.chat_id = c.id 
-            WHERE m.text LIKE ? 
-            ORDER BY m.telegram_date DESC 
-            LIMIT 50
-        """, (f'%{query}%',))
-        
-        results = cursor.fetchall()
+    def show_recent_messages(self, count: int = 10):
+        self._display_messages(rows_as_namedtuples(self.message_cursor.execute(_SQL_RECENT, (count,))))
+        
+    def search_by_text(self, query: str):
+        cursor = self.message_cursor
+        results = []
+        if self.has_fts:
+            results = rows_as_namedtuples(cursor.execute(_SQL_TEXT_SEARCH, (fts_query(query),)))
+        
+        if not results:
+            # Fall back to a literal substring scan (the only text search without messages_fts)
+            results = rows_as_namedtuples(cursor.execute(_SQL_TEXT_LIKE, (f'%{escape_like(query)}%',)))
+        
         print(f"\nFound {len(results)} messages containing '{query}':")
         self._display_messages(results)
         
-    def search_by_sender(self):
-        sender = input("\nEnter sender name: ").strip()
-        if not sender:
-            print("No sender name provided.")
-            return
-            
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT m.*, c.name as chat_name 
-            FROM messages m 
-            JOIN chats c ON m.chat_id = c.id 
-            WHERE m.sender_name LIKE ? 
-            ORDER BY m.telegram_date DESC 
-            LIMIT 50
-        """, (f'%{sender}%',))
-        
-        results = cursor.fetchall()
+    def search_by_sender(self, sender: str):
+        cursor = self.message_cursor
+        # Prefix match as a range seek on the NOCASE sender index
+        lower_bound = sender.lower()
+        upper_bound = prefix_upper_bound(lower_bound)
+        if upper_bound:
+            results = rows_as_namedtuples(cursor.execute(_SQL_SENDER_RANGE, (lower_bound, upper_bound)))
+        else:
+            results = rows_as_namedtuples(cursor.execute(_SQL_SENDER_FROM, (lower_bound,)))
+        
+        if not results:
+            # Fall back to a literal substring scan for infix matches
+            results = rows_as_namedtuples(cursor.execute(_SQL_SENDER_LIKE, (f'%{escape_like(sender)}%',)))
+        
         print(f"\nFound {len(results)} messages from '{sender}':")
         self._display_messages(results)
         
-    def show_chat_messages(self):
-        self.list_chats()
-        chat_id = input("\nEnter chat ID: ").strip()
-        if not chat_id.isdigit():
-            print("Invalid chat ID.")
-            return
-            
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT m.*, c.name as chat_name 
-            FROM messages m 
-            JOIN chats c ON m.chat_id = c.id 
-            WHERE m.chat_id = ? 
-            ORDER BY m.telegram_date DESC 
-            LIMIT 50
-        """, (int(chat_id),))
-        
-        self._display_messages(cursor.fetchall())
-        
-    def export_messages(self):
-        filename = input("\nEnter output filename (default: telegram_export.txt): ").strip()
-        filename = filename or "telegram_export.txt"
-        
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT m.*, c.name as chat_name 
-            FROM messages m 
-            JOIN chats c ON m.chat_id = c.id 
-            ORDER BY m.telegram_date
-        """)
+    def show_chat_messages(self, chat_id: int):
+        self._display_messages(rows_as_namedtuples(self.message_cursor.execute(_SQL_CHAT_MESSAGES, (chat_id,))))
         
-        with open(filename, 'w', encoding='utf-8') as f:
-            count = 0
-            for msg in cursor:
-                count += 1
-                f.write(f"[{msg['telegram_date']}] {msg['chat_name']}\n")
-                f.write(f"{msg['sender_name'] or 'Unknown'}: {msg['text'] or '[No text]'}\n")
-                f.write("-" * 80 + "\n")
-                
+    def export_messages(self, filename: str = "telegram_export.txt"):
+        count = self.export_messages_to_file(filename)
         print(f"Exported {count} messages to {filename}")
         
-    def _display_messages(self, messages):
-        for msg in messages:
-            print(f"\n[{msg['telegram_date']}] {msg['chat_name']}")
-            print(f"{msg['sender_name'] or 'Unknown'}: ", end='')
-            
-            text = msg['text'] or '[No text]'
-            if len(text) > 150:
-                text = text[:150] + '...'
-            print(text)
+    def export_messages_to_file(self, filename: str) -> int:
+        """Write the full export to `filename` and return the number of messages written."""
+        count = 0
+        with open(filename, 'wb', buffering=1 << 20) as f:
+            for chunk, rows in self._export_chunks():
+                f.write(chunk)
+                count += rows
+        return count
+        
+    def iter_export(self) -> Iterator[bytes]:
+        """Yield the export of every message, oldest first, as ~64KB UTF-8 chunks."""
+        for chunk, _ in self._export_chunks():
+            yield chunk
             
-            if msg['media_type']:
-                print(f"[Media: {msg['media_type']}]")
+    def _export_chunks(self) -> Iterator[Tuple[bytes, int]]:
+        # Own cursor, so a partially consumed export doesn't collide with other lookups
+        cursor = self.conn.execute(_SQL_EXPORT)
+        
+        separator = "-" * 80 + "\n"
+        buf = []
+        size = 0
+        count = 0
+        while rows := cursor.fetchmany(EXPORT_FETCH_SIZE):
+            for telegram_date, chat_name, sender_name, text in rows:
+                entry = "".join((
+                    f"[{telegram_date}] {chat_name}\n",
+                    f"{sender_name or 'Unknown'}: {text or '[No text]'}\n",
+                    separator,
+                ))
+                buf.append(entry)
+                size += len(entry)
+            count += len(rows)
+            if size >= EXPORT_CHUNK_SIZE:
+                yield "".join(buf).encode('utf-8'), count
+                buf.clear()
+                size = 0
+                count = 0
+        if buf:
+            yield "".join(buf).encode('utf-8'), count
+        
+    def _display_messages(self, messages):
+        # Format the whole batch up front and emit it with a single write
+        sys.stdout.write("".join(map(format_display_message, messages)))
                 
-    def run(self):
+    async def run(self):
+        """Menu loop; prompts are read on the event loop and SQLite work runs in worker threads."""
         while True:
             self.show_menu()
-            choice = input("Enter your choice: ").strip()
+            choice = (await read_line("Enter your choice: ")).strip()
             
             if choice == '0':
                 print("Goodbye!")
                 break
-            elif choice == '1':
-                self.get_stats()
-            elif choice == '2':
-                self.list_chats()
-            elif choice == '3':
-                self.show_recent_messages()
-            elif choice == '4':
-                self.search_by_text()
-            elif choice == '5':
-                self.search_by_sender()
-            elif choice == '6':
-                self.show_chat_messages()
-            elif choice == '7':
-                self.export_messages()
-            else:
+            
+            if not await self._run_action(choice):
                 print("Invalid choice. Please try again.")
                 
-            input("\nPress Enter to continue...")
+            await read_line("\nPress Enter to continue...")
+            
+    async def _run_action(self, choice: str) -> bool:
+        """Prompt for a menu action's input, then run its queries off the event loop. False for an unknown choice."""
+        if choice == '1':
+            await asyncio.to_thread(self.get_stats)
+        elif choice == '2':
+            await asyncio.to_thread(self.list_chats)
+        elif choice == '3':
+            count = (await read_line("\nHow many recent messages to show? (default: 10): ")).strip()
+            await asyncio.to_thread(self.show_recent_messages, int(count) if count else 10)
+        elif choice == '4':
+            query = (await read_line("\nEnter search text: ")).strip()
+            if not query:
+                print("No search query provided.")
+                return True
+            await asyncio.to_thread(self.search_by_text, query)
+        elif choice == '5':
+            sender = (await read_line("\nEnter sender name: ")).strip()
+            if not sender:
+                print("No sender name provided.")
+                return True
+            await asyncio.to_thread(self.search_by_sender, sender)
+        elif choice == '6':
+            await asyncio.to_thread(self.list_chats)
+            chat_id = (await read_line("\nEnter chat ID: ")).strip()
+            if not chat_id.isdigit():
+                print("Invalid chat ID.")
+                return True
+            await asyncio.to_thread(self.show_chat_messages, int(chat_id))
+        elif choice == '7':
+            filename = (await read_line("\nEnter output filename (default: telegram_export.txt): ")).strip()
+            await asyncio.to_thread(self.export_messages, filename or "telegram_export.txt")
+        else:
+            return False
+        return True
+        
+    def close(self):
+        """Close the browsing connection; after --prepare, also refresh planner statistics for the next session."""
+        if getattr(self, 'conn', None) is None:
+            return
+        self.conn.close()
+        self.conn = None
+        # Writes stay opt-in like the rest of the setup, and an immutable database must not change
+        # under other readers
+        if self.prepared and not self.immutable:
+            self._optimize()
+            
+    def _optimize(self):
+        """Run PRAGMA optimize over a short-lived writable connection; skipped on read-only files."""
+        try:
+            # Short busy timeout: if the ingester holds the write lock, skip rather than delay exit
+            conn = sqlite3.connect(f"{Path(self.db_path).resolve().as_uri()}?mode=rw", uri=True, timeout=0.2)
+        except sqlite3.Error:
+            return
+        try:
+            # optimize only considers tables this connection has planned queries against,
+            # so plan the message lookups first; analysis_limit keeps each ANALYZE to a sample
+            for sql, params in _OPTIMIZE_PLANS:
+                conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+            conn.execute("PRAGMA analysis_limit=400")
+            conn.execute("PRAGMA optimize")
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
             
     def __del__(self):
-        if hasattr(self, 'conn'):
-            self.conn.close()
+        self.close()
 
 if __name__ == "__main__":
-    explorer = InteractiveTelegramExplorer()
+    parser = argparse.ArgumentParser(description='Interactively browse the Telegram messages database')
+    parser.add_argument('--db', default='tmp/telegram_messages.db', help='Database path')
+    parser.add_argument('--prepare', action='store_true', 
+                        help='Create the search indexes, FTS table and aggregates first (writes to the database)')
+    args = parser.parse_args()
+    
+    explorer = InteractiveTelegramExplorer(args.db, prepare=args.prepare)
     try:
-        explorer.run()
+        asyncio.run(explorer.run())
     except KeyboardInterrupt:
         print("\n\nInterrupted by user. Goodbye!")
     except Exception as e:
         print(f"\nError: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+    finally:
+        explorer.close()
\ No newline at end of file
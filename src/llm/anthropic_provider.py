@@ -1,14 +1,17 @@
+import json
 import os
-from typing import Optional
+from typing import AsyncIterator, Optional
 from anthropic import AsyncAnthropic
 
-from .base import LLMProvider, LLMResponse
+from .base import LLM_MAX_RETRIES, LLMProvider, LLMResponse, create_http_client
 
 
 class AnthropicProvider(LLMProvider):
     def __init__(self, api_key: Optional[str] = None):
         self.client = AsyncAnthropic(
-            api_key=api_key or os.getenv("ANTHROPIC_API_KEY")
+            api_key=api_key or os.getenv("ANTHROPIC_API_KEY"),
+            http_client=create_http_client(),
+            max_retries=LLM_MAX_RETRIES
         )
     
     async def generate_response(
@@ -17,20 +20,32 @@ class AnthropicProvider(LLMProvider):
         user_prompt: str,
         model: Optional[str] = None,
         temperature: float = 0.7,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        response_format: Optional[dict] = None
     ) -> LLMResponse:
         model = model or self.get_default_model()
         
+        # Anthropic has no JSON mode; force a tool call whose input schema is the requested schema
+        tool_kwargs = {}
+        if response_format and response_format.get("type") == "json_schema":
+            json_schema = response_format["json_schema"]
+            tool_kwargs = {
+                "tools": [{"name": json_schema["name"], "input_schema": json_schema["schema"]}],
+                "tool_choice": {"type": "tool", "name": json_schema["name"]}
+            }
+        
         response = await self.client.messages.create(
             model=model,
             system=system_prompt,
             messages=[{"role": "user", "content": user_prompt}],
             temperature=temperature,
-            max_tokens=max_tokens or 1024
+            max_tokens=max_tokens or 1024,
+            **tool_kwargs
         )
         
+        block = response.content[0]
         return LLMResponse(
-            content=response.content[0].text,
+            content=json.dumps(block.input) if block.type == "tool_use" else block.text,
             model=model,
             usage={
                 "input_tokens": response.usage.input_tokens,
@@ -38,5 +53,25 @@ class AnthropicProvider(LLMProvider):
             } if response.usage else None
         )
     
+    async def stream_response(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        model = model or self.get_default_model()
+        
+        async with self.client.messages.stream(
+            model=model,
+            system=system_prompt,
+            messages=[{"role": "user", "content": user_prompt}],
+            temperature=temperature,
+            max_tokens=max_tokens or 1024
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+    
     def get_default_model(self) -> str:
         return "claude-3-haiku-20240307"
\ No newline at end of file
@@ -1,7 +1,22 @@
+import os
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import AsyncIterator, Optional
+import httpx
 from pydantic import BaseModel
 
+# Attempts the SDK clients retry rate-limited (429), overloaded and dropped requests, backing off
+# exponentially with jitter and honouring Retry-After; concurrent expansion batches hit rate limits
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create the pooled HTTP/2 client used by provider SDK clients."""
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+        timeout=httpx.Timeout(30.0, connect=5.0)
+    )
+
 
 class LLMResponse(BaseModel):
     content: str
@@ -19,9 +34,26 @@ class LLMProvider(ABC):
         user_prompt: str,
         model: Optional[str] = None,
         temperature: float = 0.7,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        response_format: Optional[dict] = None
     ) -> LLMResponse:
-        """Generate a response from the LLM."""
+        """Generate a response from the LLM.
+        
+        `response_format` takes an OpenAI-style {"type": "json_schema", "json_schema": {...}}
+        spec to constrain the output to JSON matching the schema.
+        """
+        pass
+    
+    @abstractmethod
+    def stream_response(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """Stream the LLM's response as text deltas while it is being generated."""
         pass
     
     @abstractmethod
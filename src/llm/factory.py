@@ -14,6 +14,9 @@ class LLMFactory:
         "anthropic": AnthropicProvider,
     }
     
+    # Shared provider instances, keyed by provider name and API key
+    _instances: dict[tuple[str, Optional[str]], LLMProvider] = {}
+    
     @classmethod
     def create_provider(
         self,
@@ -32,6 +35,21 @@ class LLMFactory:
         provider_class = self._providers[provider_name]
         return provider_class(**kwargs)
     
+    @classmethod
+    def get_provider(
+        cls,
+        provider_name: Optional[str] = None,
+        api_key: Optional[str] = None
+    ) -> LLMProvider:
+        """Get the shared provider instance, creating it on first use so its connection pool is reused."""
+        provider_name = provider_name or os.getenv("LLM_PROVIDER", "openai")
+        key = (provider_name, api_key)
+        
+        if key not in cls._instances:
+            kwargs = {"api_key": api_key} if api_key else {}
+            cls._instances[key] = cls.create_provider(provider_name, **kwargs)
+        return cls._instances[key]
+    
     @classmethod
     def get_available_providers(cls) -> list[str]:
         """Get list of available provider names."""
@@ -1,14 +1,16 @@
 import os
-from typing import Optional
-from openai import AsyncOpenAI
+from typing import AsyncIterator, Optional
+from openai import NOT_GIVEN, AsyncOpenAI
 
-from .base import LLMProvider, LLMResponse
+from .base import LLM_MAX_RETRIES, LLMProvider, LLMResponse, create_http_client
 
 
 class OpenAIProvider(LLMProvider):
     def __init__(self, api_key: Optional[str] = None):
         self.client = AsyncOpenAI(
-            api_key=api_key or os.getenv("OPENAI_API_KEY")
+            api_key=api_key or os.getenv("OPENAI_API_KEY"),
+            http_client=create_http_client(),
+            max_retries=LLM_MAX_RETRIES
         )
     
     async def generate_response(
@@ -17,7 +19,8 @@ class OpenAIProvider(LLMProvider):
         user_prompt: str,
         model: Optional[str] = None,
         temperature: float = 0.7,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        response_format: Optional[dict] = None
     ) -> LLMResponse:
         model = model or self.get_default_model()
         
@@ -30,7 +33,8 @@ class OpenAIProvider(LLMProvider):
             model=model,
             messages=messages,
             temperature=temperature,
-            max_tokens=max_tokens
+            max_tokens=max_tokens,
+            response_format=response_format or NOT_GIVEN
         )
         
         return LLMResponse(
@@ -39,5 +43,32 @@ class OpenAIProvider(LLMProvider):
             usage=response.usage.model_dump() if response.usage else None
         )
     
+    async def stream_response(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        model = model or self.get_default_model()
+        
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
     def get_default_model(self) -> str:
         return "gpt-4o-mini"
\ No newline at end of file
@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import List, Optional, Tuple
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 from .database import TelegramMessage
 
@@ -14,6 +14,8 @@ class SearchToolInput(BaseModel):
 
 
 class MessageWithScore(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     message: TelegramMessage
     relevance_score: float = Field(..., description="Semantic similarity score")
     expanded_text: Optional[str] = Field(None, description="LLM-expanded version if available")
@@ -24,6 +26,7 @@ class SearchToolOutput(BaseModel):
     total_found: int = Field(0, description="Total number of matching messages")
     messages_with_scores: Optional[List[MessageWithScore]] = Field(None, description="Messages with debug info")
     rewritten_query: Optional[str] = Field(None, description="LLM-rewritten version of the query")
+    top_relevance_score: Optional[float] = Field(None, description="Similarity score of the best matching message")
 
 
 class AgentContext(BaseModel):
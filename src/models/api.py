@@ -1,11 +1,12 @@
 from datetime import datetime
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Union
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class HealthCheckResponse(BaseModel):
     status: str = Field(default="ok", description="Service status")
     version: str = Field(default="1.1", description="API version")
+    query_cache: Optional[Dict[str, Union[int, float]]] = Field(None, description="Query cache hit/miss counters")
 
 
 class QueryRequest(BaseModel):
@@ -16,6 +17,8 @@ class QueryRequest(BaseModel):
 
 
 class SourceMessage(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     message_id: str = Field(..., description="Unique message identifier")
     sender: str = Field(..., description="Name of the message sender")
     timestamp: datetime = Field(..., description="When the message was sent")
@@ -1,9 +1,11 @@
 from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class TelegramMessage(BaseModel):
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+    
     message_id: str = Field(..., description="Unique message identifier")
     chat_id: str = Field(..., description="Chat/group ID where message was sent")
     user_id: str = Field(..., description="User ID who sent the message")
@@ -11,6 +13,3 @@ class TelegramMessage(BaseModel):
     text: str = Field(..., description="Message content")
     timestamp: datetime = Field(..., description="When the message was sent")
     reply_to_message_id: Optional[str] = Field(None, description="ID of message being replied to")
-    
-    class Config:
-        from_attributes = True
\ No newline at end of file
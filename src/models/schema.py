@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Text, Integer, Float, Index, ForeignKey, BigInteger, Boolean
+from sqlalchemy import and_, Column, String, DateTime, Text, Integer, Float, Index, ForeignKey, BigInteger, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -32,6 +32,16 @@ class Message(Base):
     media_file_name = Column(String(255), nullable=True)
     media_file_size = Column(BigInteger, nullable=True)
     
+    # Serves the "latest messages in a chat before a date" context lookups, and the
+    # date-ordered scans over messages with text done by expansion and indexing
+    __table_args__ = (
+        Index('ix_messages_chat_date', 'chat_id', telegram_date.desc()),
+        Index(
+            'ix_messages_text_date', telegram_date,
+            sqlite_where=and_(text.isnot(None), text != '')
+        ),
+    )
+    
     # Properties for compatibility with TelegramMessage model
     @property
     def message_id(self):
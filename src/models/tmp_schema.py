@@ -4,11 +4,13 @@ This allows us to work with the existing database structure.
 """
 from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class TmpTelegramMessage(BaseModel):
     """Message model that matches the tmp/ database schema."""
+    model_config = ConfigDict(from_attributes=True)
+    
     telegram_id: int = Field(..., description="Telegram message ID")
     chat_id: int = Field(..., description="Database chat ID (not Telegram chat ID)")
     text: Optional[str] = Field(None, description="Message content")
@@ -20,13 +22,12 @@ class TmpTelegramMessage(BaseModel):
     is_outgoing: Optional[bool] = Field(False, description="If message is outgoing")
     is_reply: Optional[bool] = Field(False, description="If message is a reply")
     reply_to_message_id: Optional[int] = Field(None, description="ID of replied message")
-    
-    class Config:
-        from_attributes = True
 
 
 class TmpChat(BaseModel):
     """Chat model that matches the tmp/ database schema."""
+    model_config = ConfigDict(from_attributes=True)
+    
     telegram_id: int = Field(..., description="Telegram chat ID")
     name: str = Field(..., description="Chat name")
     username: Optional[str] = Field(None, description="Chat username")
@@ -34,6 +35,3 @@ class TmpChat(BaseModel):
     is_verified: Optional[bool] = Field(False, description="If chat is verified")
     is_scam: Optional[bool] = Field(False, description="If chat is marked as scam")
     is_fake: Optional[bool] = Field(False, description="If chat is marked as fake")
-    
-    class Config:
-        from_attributes = True
\ No newline at end of file
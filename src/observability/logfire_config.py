@@ -1,9 +1,52 @@
+import asyncio
+import inspect
 import os
 from functools import wraps
-from typing import Any, Callable
+from types import NoneType, UnionType
+from typing import Any, Callable, FrozenSet, Optional, Union, get_args, get_origin
+from weakref import WeakKeyDictionary
 import logfire
+from dotenv import load_dotenv
 from pydantic import BaseModel
 
+# Load environment variables
+load_dotenv()
+
+# Spans only go somewhere when sending to Logfire or printing to the console; otherwise
+# the decorators below return the undecorated function
+_TRACING_ENABLED = (
+    os.getenv("LOGFIRE_TOKEN") is not None
+    or os.getenv("LOGFIRE_CONSOLE", "true").lower() == "true"
+)
+
+# Level of the per-call tool spans on the request hot path; "off" skips them entirely
+_HOT_LEVEL = os.getenv("TELEQUERY_TRACE_LEVEL", "info").lower()
+
+# Field types recorded as span attributes; anything else (lists, nested models) is left out
+_SCALAR_TYPES = (str, int, float, bool, NoneType)
+
+# Scalar field names per model class, computed on first use
+_SPAN_FIELDS: "WeakKeyDictionary[type, FrozenSet[str]]" = WeakKeyDictionary()
+
+
+def _is_scalar(annotation: Any) -> bool:
+    if get_origin(annotation) in (Union, UnionType):
+        return all(arg in _SCALAR_TYPES for arg in get_args(annotation))
+    return annotation in _SCALAR_TYPES
+
+
+def _span_context(model: BaseModel) -> dict:
+    """Dump only the scalar fields of a model for use as span attributes."""
+    model_cls = type(model)
+    fields = _SPAN_FIELDS.get(model_cls)
+    if fields is None:
+        fields = frozenset(
+            name for name, info in model_cls.model_fields.items() if _is_scalar(info.annotation)
+        )
+        _SPAN_FIELDS[model_cls] = fields
+    # Scalars need no serialization, so read them directly instead of going through model_dump
+    return {name: getattr(model, name) for name in fields}
+
 
 def configure_logfire():
     """Configure logfire with appropriate settings."""
@@ -21,143 +64,99 @@ def configure_logfire():
     )
 
 
-def log_agent_operation(operation_name: str):
-    """Decorator to log agent operations with structured data."""
-    def decorator(func: Callable) -> Callable:
+def _record_agent_result(span, result: Any):
+    # Log result data if it's a Pydantic model, serialized to JSON by pydantic-core directly
+    if isinstance(result, BaseModel):
+        span.set_attribute("result", result.model_dump_json())
+
+
+def _record_tool_result(span, result: Any):
+    if isinstance(result, BaseModel):
+        # For search results, log summary info instead of dumping every message
+        messages = getattr(result, "messages", None)
+        if isinstance(messages, list):
+            span.set_attribute("result.message_count", len(messages))
+            if "messages_with_scores" in type(result).model_fields:
+                span.set_attribute("result.has_scores", True)
+        else:
+            span.set_attribute("result", result.model_dump_json())
+
+
+def _record_error(span, e: Exception):
+    span.set_attribute("error", str(e))
+    span.set_attribute("error_type", type(e).__name__)
+
+
+def _takes_model(func: Callable) -> bool:
+    """Whether the argument after `self` is annotated as a Pydantic model (or not annotated at all)."""
+    params = list(inspect.signature(func).parameters.values())
+    if len(params) < 2:
+        return False
+    annotation = params[1].annotation
+    if isinstance(annotation, type):
+        return issubclass(annotation, BaseModel)
+    # Unannotated or string annotations: decide per call
+    return True
+
+
+def _instrument(func: Callable, span_name: str, record_result: Callable, level: str = "info") -> Callable:
+    """Wrap `func` in a `level` span named `span_name`, picking the sync or async wrapper once at decoration time."""
+    if not _TRACING_ENABLED or level == "off":
+        return func
+    
+    # Functions that never receive a model get a span without any context attributes
+    if _takes_model(func):
+        def open_span(args):
+            # If first arg after self is a Pydantic model, record its scalar fields
+            if len(args) > 1 and isinstance(args[1], BaseModel):
+                return logfire.span(span_name, _level=level, **_span_context(args[1]))
+            return logfire.span(span_name, _level=level)
+    else:
+        def open_span(args):
+            return logfire.span(span_name, _level=level)
+    
+    if asyncio.iscoroutinefunction(func):
         @wraps(func)
         async def async_wrapper(*args, **kwargs):
-            # Extract relevant data from args
-            instance = args[0] if args else None
-            context_data = {}
-            
-            # If first arg after self is a Pydantic model, extract its data
-            if len(args) > 1 and isinstance(args[1], BaseModel):
-                context_data = args[1].model_dump()
-            
-            with logfire.span(
-                f"agent.{operation_name}",
-                **context_data
-            ) as span:
+            with open_span(args) as span:
                 try:
                     result = await func(*args, **kwargs)
-                    
-                    # Log result data if it's a Pydantic model
-                    if isinstance(result, BaseModel):
-                        span.set_attribute("result", result.model_dump())
-                    
-                    return result
-                except Exception as e:
-                    span.set_attribute("error", str(e))
-                    span.set_attribute("error_type", type(e).__name__)
-                    raise
-        
-        @wraps(func)
-        def sync_wrapper(*args, **kwargs):
-            # Extract relevant data from args
-            instance = args[0] if args else None
-            context_data = {}
-            
-            # If first arg after self is a Pydantic model, extract its data
-            if len(args) > 1 and isinstance(args[1], BaseModel):
-                context_data = args[1].model_dump()
-            
-            with logfire.span(
-                f"agent.{operation_name}",
-                **context_data
-            ) as span:
-                try:
-                    result = func(*args, **kwargs)
-                    
-                    # Log result data if it's a Pydantic model
-                    if isinstance(result, BaseModel):
-                        span.set_attribute("result", result.model_dump())
-                    
-                    return result
                 except Exception as e:
-                    span.set_attribute("error", str(e))
-                    span.set_attribute("error_type", type(e).__name__)
+                    _record_error(span, e)
                     raise
+                record_result(span, result)
+                return result
         
-        # Return appropriate wrapper based on function type
-        import asyncio
-        if asyncio.iscoroutinefunction(func):
-            return async_wrapper
-        else:
-            return sync_wrapper
+        return async_wrapper
+    
+    @wraps(func)
+    def sync_wrapper(*args, **kwargs):
+        with open_span(args) as span:
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                _record_error(span, e)
+                raise
+            record_result(span, result)
+            return result
+    
+    return sync_wrapper
+
+
+def log_agent_operation(operation_name: str):
+    """Decorator to log agent operations with structured data."""
+    def decorator(func: Callable) -> Callable:
+        return _instrument(func, f"agent.{operation_name}", _record_agent_result)
     
     return decorator
 
 
-def log_tool_operation(tool_name: str):
-    """Decorator to log tool operations with structured data."""
+def log_tool_operation(tool_name: str, level: Optional[str] = None):
+    """Decorator to log tool operations with structured data.
+    
+    Spans use `level` (default: TELEQUERY_TRACE_LEVEL, "info"); "off" leaves the function undecorated.
+    """
     def decorator(func: Callable) -> Callable:
-        @wraps(func)
-        async def async_wrapper(*args, **kwargs):
-            # Extract input data
-            context_data = {}
-            if args and len(args) > 1 and isinstance(args[1], BaseModel):
-                context_data = args[1].model_dump()
-            
-            with logfire.span(
-                f"tool.{tool_name}",
-                **context_data
-            ) as span:
-                try:
-                    result = await func(*args, **kwargs)
-                    
-                    # Log result data if it's a Pydantic model
-                    if isinstance(result, BaseModel):
-                        result_data = result.model_dump()
-                        # For search results, log summary info instead of full messages
-                        if "messages" in result_data and isinstance(result_data["messages"], list):
-                            span.set_attribute("result.message_count", len(result_data["messages"]))
-                            if "messages_with_scores" in result_data:
-                                span.set_attribute("result.has_scores", True)
-                        else:
-                            span.set_attribute("result", result_data)
-                    
-                    return result
-                except Exception as e:
-                    span.set_attribute("error", str(e))
-                    span.set_attribute("error_type", type(e).__name__)
-                    raise
-        
-        @wraps(func)
-        def sync_wrapper(*args, **kwargs):
-            # Extract input data
-            context_data = {}
-            if args and len(args) > 1 and isinstance(args[1], BaseModel):
-                context_data = args[1].model_dump()
-            
-            with logfire.span(
-                f"tool.{tool_name}",
-                **context_data
-            ) as span:
-                try:
-                    result = func(*args, **kwargs)
-                    
-                    # Log result data if it's a Pydantic model
-                    if isinstance(result, BaseModel):
-                        result_data = result.model_dump()
-                        # For search results, log summary info instead of full messages
-                        if "messages" in result_data and isinstance(result_data["messages"], list):
-                            span.set_attribute("result.message_count", len(result_data["messages"]))
-                            if "messages_with_scores" in result_data:
-                                span.set_attribute("result.has_scores", True)
-                        else:
-                            span.set_attribute("result", result_data)
-                    
-                    return result
-                except Exception as e:
-                    span.set_attribute("error", str(e))
-                    span.set_attribute("error_type", type(e).__name__)
-                    raise
-        
-        # Return appropriate wrapper based on function type
-        import asyncio
-        if asyncio.iscoroutinefunction(func):
-            return async_wrapper
-        else:
-            return sync_wrapper
+        return _instrument(func, f"tool.{tool_name}", _record_tool_result, level or _HOT_LEVEL)
     
-    return decorator
\ No newline at end of file
+    return decorator
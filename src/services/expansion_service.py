@@ -1,24 +1,33 @@
 import asyncio
 import os
 from typing import Optional
-from datetime import datetime
 from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 
 from ..models.schema import Message as SourceMessage
 from ..database.expansion_schema import MessageExpansion, Base
-from ..indexing.contextualizer import MessageContextualizer
+from ..database.pragmas import apply_sqlite_pragmas, run_if_schema_outdated
+from ..clients.registry import get_expansion_engine
+from ..indexing.contextualizer import MESSAGE_COLUMNS, MessageContextualizer, MessageRow
 from ..models.database import TelegramMessage
+from ..settings import SETTINGS
 
+# Stored in the expansion database's PRAGMA user_version; bump when its tables change
+EXPANSION_SCHEMA_VERSION = 1
+
+# Maximum number of batch expansions awaiting the LLM at the same time
+EXPANSION_CONCURRENCY = int(os.getenv("EXPANSION_CONCURRENCY", "16"))
+
+# Number of expansion rows written per transaction; kept small so little paid-for LLM work is
+# lost if a run dies between flushes
+EXPANSION_COMMIT_BATCH = 500
+
+# Per-batch progress lines are only printed when TELEQUERY_VERBOSE=true; errors and totals always are
+VERBOSE = os.getenv("TELEQUERY_VERBOSE", "false").lower() == "true"
+
+# Message columns read for pending messages, qualified for the anti-join
+PENDING_MESSAGE_SELECT = ", ".join(f"m.{column}" for column in MESSAGE_COLUMNS)
 
-def _to_datetime(date_str: str) -> Optional[datetime]:
-    if not date_str:
-        return None
-    try:
-        # Handle different string formats, including ISO 8601
-        return datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-    except (ValueError, TypeError):
-        return None
 
 class ExpansionService:
     """Service for automatically processing message expansions."""
@@ -28,13 +37,20 @@ class ExpansionService:
         self.expansion_db_path = expansion_db_path
         
         # Create database engines
-        self.source_engine = create_engine(database_url)
-        self.expansion_engine = create_engine(f"sqlite:///{expansion_db_path}")
+        self.source_engine = apply_sqlite_pragmas(create_engine(
+            database_url,
+            connect_args={"check_same_thread": False} if database_url.startswith("sqlite") else {}
+        ))
+        self.expansion_engine = get_expansion_engine(f"sqlite:///{expansion_db_path}")
         
         # Create session makers
         self.SourceSession = sessionmaker(bind=self.source_engine)
         self.ExpansionSession = sessionmaker(bind=self.expansion_engine)
         
+        # Long-lived sessions reused by every poll instead of opening fresh ones per call
+        self._source_session = scoped_session(self.SourceSession)
+        self._expansion_session = scoped_session(self.ExpansionSession)
+        
         # Ensure expansion database exists
         self._ensure_expansion_database()
     
@@ -43,68 +59,45 @@ class ExpansionService:
         # Create directory if it doesn't exist
         os.makedirs(os.path.dirname(self.expansion_db_path), exist_ok=True)
         
-        # Create tables
-        Base.metadata.create_all(self.expansion_engine)
+        # Create tables unless the database is already at the current schema version
+        run_if_schema_outdated(
+            self.expansion_engine,
+            EXPANSION_SCHEMA_VERSION,
+            lambda: Base.metadata.create_all(self.expansion_engine)
+        )
         print(f"✅ Expansion database initialized at: {self.expansion_db_path}")
     
-    async def process_new_messages(self, batch_size: int = 50) -> int:
+    def _end_transactions(self):
+        """End the sessions' transactions so the next call sees fresh data; the sessions stay open."""
+        self._source_session.rollback()
+        self._expansion_session.rollback()
+    
+    async def process_new_messages(self, batch_size: int = 50, concurrency: Optional[int] = None) -> int:
         """
         Process new messages in batches that haven't been expanded yet.
-        Uses overlapping batches for better context continuity.
+        Each batch is prompted with the messages preceding it for context, expanding up to
+        `concurrency` batches at once (default: EXPANSION_CONCURRENCY).
         Returns the number of messages processed.
         """
-        source_session = self.SourceSession()
-        expansion_session = self.ExpansionSession()
+        source_session = self._source_session()
+        expansion_session = self._expansion_session()
         
         try:
-            # Find which message IDs have already been processed
-            processed_ids_query = expansion_session.query(MessageExpansion.message_id).all()
-            processed_ids = {pid[0] for pid in processed_ids_query}
-            
-            print(f"📊 Found {len(processed_ids)} already expanded messages")
-            
-            # Find new messages that need expansion using raw SQL
-            # Always fetch all messages and filter in memory to avoid SQL parameter limits
-            all_messages_query = text("SELECT * FROM messages WHERE text IS NOT NULL AND text != '' ORDER BY telegram_date ASC")
-            all_results = source_session.execute(all_messages_query).fetchall()
-            
-            # Filter out processed messages
-            if processed_ids:
-                results = [row for row in all_results if str(row[1]) not in processed_ids]
-            else:
-                results = all_results
-            
-            # Convert raw results to SourceMessage objects
-            new_messages = []
-            for row in results:
-                # Create a simple object with the needed attributes
-                msg = type('Message', (), {
-                    'id': row[0],
-                    'telegram_id': row[1],
-                    'chat_id': row[2],
-                    'text': row[3],
-                    'message_type': row[4],
-                    'sender_id': row[5],
-                    'sender_name': row[6],
-                    'sender_username': row[7],
-                    'telegram_date': _to_datetime(row[8]),
-                    'created_at': _to_datetime(row[9]),
-                    'updated_at': _to_datetime(row[10]),
-                    'is_outgoing': row[11],
-                    'is_reply': row[12],
-                    'reply_to_message_id': row[13],
-                    'forward_from_id': row[14],
-                    'forward_from_name': row[15],
-                    'media_type': row[16],
-                    'media_file_id': row[17],
-                    'media_file_name': row[18],
-                    'media_file_size': row[19],
-                    # Add properties for compatibility
-                    'message_id': str(row[1]),  # telegram_id
-                    'timestamp': _to_datetime(row[8]),        # telegram_date
-                    'user_id': str(row[5]) if row[5] else "unknown"  # sender_id
-                })()
-                new_messages.append(msg)
+            expanded_count = expansion_session.query(MessageExpansion).count()
+            print(f"📊 Found {expanded_count} already expanded messages")
+            
+            # Anti-join against the attached expansion database so SQLite skips processed messages itself
+            source_session.execute(text("ATTACH DATABASE :path AS exp"), {"path": self.expansion_db_path})
+            try:
+                result = source_session.execute(text(f"""
+                    SELECT {PENDING_MESSAGE_SELECT} FROM messages m 
+                    LEFT JOIN exp.message_expansions e ON e.message_id = CAST(m.telegram_id AS TEXT) 
+                    WHERE e.message_id IS NULL AND m.text IS NOT NULL AND m.text != '' 
+                    ORDER BY m.telegram_date ASC
+                """))
+                new_messages = [MessageRow(*row) for row in result]
+            finally:
+                source_session.execute(text("DETACH DATABASE exp"))
             
             if not new_messages:
                 print("✅ No new messages to expand")
@@ -113,54 +106,68 @@ class ExpansionService:
             print(f"🔄 Processing {len(new_messages)} new messages in batches of {batch_size}...")
             
             contextualizer = MessageContextualizer(source_session, expansion_session)
+            
+            # Split messages into disjoint batches; each batch is still prompted with the messages
+            # preceding it (its context window), so nothing is expanded twice for continuity
+            batches = [
+                (batch_start, min(batch_start + batch_size, len(new_messages)))
+                for batch_start in range(0, len(new_messages), batch_size)
+            ]
+            
+            # Fetch the context windows of all batches up front instead of one query per batch
+            context_windows = contextualizer._get_batches_with_context(
+                [new_messages[batch_start:batch_end] for batch_start, batch_end in batches]
+            )
+            
+            # Overlap the LLM round-trips of up to `concurrency` batches at a time
+            semaphore = asyncio.Semaphore(concurrency or EXPANSION_CONCURRENCY)
+            
+            # Expansions are buffered and written in large transactions instead of one commit per batch
+            pending_rows = []
             total_processed = 0
             
-            # Process messages in overlapping batches
-            overlap_size = min(10, batch_size // 5)  # 10 messages overlap or 20% of batch size
-            batch_start = 0
+            def flush_pending_rows():
+                nonlocal total_processed
+                total_processed += contextualizer.save_expansions(pending_rows)
+                pending_rows.clear()
             
-            while batch_start < len(new_messages):
-                # Get current batch
-                batch_end = min(batch_start + batch_size, len(new_messages))
+            async def process_batch(batch_start: int, batch_end: int):
                 current_batch = new_messages[batch_start:batch_end]
+                async with semaphore:
+                    if VERBOSE:
+                        print(f"🔄 Processing batch {batch_start}-{batch_end-1} ({len(current_batch)} messages)...")
+                    try:
+                        rows = await contextualizer.expand_batch(current_batch, context_windows)
+                        if VERBOSE:
+                            print(f"✅ Batch completed: {len(rows)}/{len(current_batch)} messages expanded")
+                    except Exception as e:
+                        print(f"❌ Error processing batch {batch_start}-{batch_end-1}: {e}")
+                        # Continue with other batches even if this one fails
+                        return
                 
-                if not current_batch:
-                    break
-                
-                print(f"🔄 Processing batch {batch_start}-{batch_end-1} ({len(current_batch)} messages)...")
-                
-                try:
-                    # Process the entire batch at once
-                    processed_count = await contextualizer.expand_batch_and_save(current_batch)
-                    total_processed += processed_count
-                    
-                    print(f"✅ Batch completed: {processed_count}/{len(current_batch)} messages processed")
-                    
-                except Exception as e:
-                    print(f"❌ Error processing batch {batch_start}-{batch_end-1}: {e}")
-                    # Continue with next batch even if this one fails
-                
-                # Move to next batch with overlap
-                if batch_end >= len(new_messages):
-                    break  # We've processed all messages
-                
-                batch_start = batch_end - overlap_size
-                
-                # Ensure we don't go backwards
-                if batch_start <= 0:
-                    batch_start = batch_end
+                pending_rows.extend(rows)
+                if len(pending_rows) >= EXPANSION_COMMIT_BATCH:
+                    flush_pending_rows()
+            
+            try:
+                await asyncio.gather(
+                    *(process_batch(batch_start, batch_end) for batch_start, batch_end in batches)
+                )
+            finally:
+                # Save the finished expansions even if the run is cancelled or a batch raises
+                if pending_rows:
+                    flush_pending_rows()
             
             print(f"✅ Successfully processed {total_processed} messages across all batches")
             return total_processed
             
         finally:
-            source_session.close()
-            expansion_session.close()
+            self._end_transactions()
     
     async def get_expansion_stats(self) -> dict:
         """Get statistics about the expansion database."""
-        source_session = self.SourceSession()
-        expansion_session = self.ExpansionSession()
+        source_session = self._source_session()
+        expansion_session = self._expansion_session()
         
         try:
             # Count total messages in source database using raw SQL
@@ -179,8 +186,7 @@ class ExpansionService:
             }
             
         finally:
-            source_session.close()
-            expansion_session.close()
+            self._end_transactions()
 
 
 # Global service instance
@@ -192,18 +198,9 @@ def get_expansion_service() -> ExpansionService:
     global _expansion_service
     
     if _expansion_service is None:
-        # Handle database URL with support for MAIN_DB_PATH
-        main_db_path = os.getenv("MAIN_DB_PATH")
-        if main_db_path:
-            database_url = f"sqlite:///{main_db_path}"
-        else:
-            database_url = os.getenv("DATABASE_URL", "sqlite:///../telequery_db/telegram_messages.db")
-        
-        expansion_db_path = os.getenv("EXPANSION_DB_PATH", "../telequery_db/telequery_expansions.db")
-        
         _expansion_service = ExpansionService(
-            database_url=database_url,
-            expansion_db_path=expansion_db_path
+            database_url=SETTINGS.database_url,
+            expansion_db_path=SETTINGS.expansion_db_path
         )
     
     return _expansion_service
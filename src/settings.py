@@ -0,0 +1,34 @@
+"""Service configuration, resolved from the environment once at import time."""
+import os
+from dataclasses import dataclass, field
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _default_database_url() -> str:
+    # Use main database path if provided (for Docker compatibility)
+    main_db_path = os.getenv("MAIN_DB_PATH")
+    if main_db_path:
+        return f"sqlite:///{main_db_path}"
+    return os.getenv("DATABASE_URL", "sqlite:///../telequery_db/telegram_messages.db")
+
+
+@dataclass(frozen=True)
+class Settings:
+    database_url: str = field(default_factory=_default_database_url)
+    chroma_path: str = field(default_factory=lambda: os.getenv("CHROMA_DB_PATH", "../telequery_db/chroma_db"))
+    expansion_db_path: str = field(
+        default_factory=lambda: os.getenv("EXPANSION_DB_PATH", "../telequery_db/telequery_expansions.db")
+    )
+    disable_expansion_on_startup: bool = field(
+        default_factory=lambda: os.getenv("DISABLE_EXPANSION_ON_STARTUP", "false").lower() == "true"
+    )
+    # Searches whose best match scores below this similarity are answered without calling the LLM
+    min_relevance_score: float = field(default_factory=lambda: float(os.getenv("MIN_RELEVANCE_SCORE", "0.0")))
+    # Token budget for the message context block (leaves room for instructions, question and answer)
+    max_context_tokens: int = field(default_factory=lambda: int(os.getenv("MAX_CONTEXT_TOKENS", "4096")))
+
+
+SETTINGS = Settings()
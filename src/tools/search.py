@@ -1,8 +1,13 @@
+import asyncio
+import json
 import os
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, create_engine, text
+from sqlalchemy import String, and_, bindparam, cast, or_, create_engine, func, literal_column, select, text
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 import logfire
@@ -10,19 +15,83 @@ import logfire
 # Disable ChromaDB telemetry before any imports
 os.environ["ANONYMIZED_TELEMETRY"] = "False"
 
-import chromadb
 from chromadb.utils import embedding_functions
 
 from ..models.agent import SearchToolInput, SearchToolOutput
 from ..models.database import TelegramMessage
 from ..models.schema import Message as SourceMessage
 from ..database.expansion_schema import MessageExpansion
+from ..clients.registry import get_chroma_client, get_expansion_engine
+from ..database.pragmas import apply_sqlite_pragmas
+from ..indexing.embedding_cache import EmbeddingCache
 from ..llm.factory import LLMFactory
 from ..observability.logfire_config import log_tool_operation
 
 # Load environment variables
 load_dotenv()
 
+# Columns read for each search hit: exactly the TelegramMessage fields under their field names,
+# with the string casts and fallbacks done by SQLite, so a row maps straight onto the model
+MESSAGE_RESULT_COLUMNS = (
+    cast(SourceMessage.telegram_id, String).label("message_id"),
+    cast(SourceMessage.chat_id, String).label("chat_id"),
+    func.coalesce(func.nullif(cast(SourceMessage.sender_id, String), "0"), "unknown").label("user_id"),
+    func.coalesce(func.nullif(SourceMessage.sender_name, ""), "Unknown").label("sender_name"),
+    func.coalesce(SourceMessage.text, "").label("text"),
+    SourceMessage.telegram_date.label("timestamp"),
+    func.nullif(cast(SourceMessage.reply_to_message_id, String), "0").label("reply_to_message_id"),
+)
+
+
+def _in_json_ids(column, name: str = "ids"):
+    """`column IN` the values of a JSON array bound as `name`. Unlike an expanding IN list, the SQL
+    text is the same for any number of IDs, so SQLite reuses one prepared statement."""
+    return column.in_(select(literal_column("value")).select_from(func.json_each(bindparam(name))))
+
+
+# Message rows and expansions of the search hits, with the hit IDs bound as a JSON array
+MESSAGE_RESULT_QUERY = select(*MESSAGE_RESULT_COLUMNS).where(_in_json_ids(SourceMessage.telegram_id))
+EXPANSION_RESULT_QUERY = select(MessageExpansion.message_id, MessageExpansion.expanded_text).where(
+    _in_json_ids(MessageExpansion.message_id)
+)
+
+# HNSW parameters for the message collection: a denser graph and wider candidate lists than
+# Chroma's defaults keep recall up for 100 results at 100k+ messages. They only apply when the
+# collection is created, so changing them requires a rebuild (TELEQUERY_REBUILD_INDEX=1)
+COLLECTION_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": int(os.getenv("CHROMA_HNSW_M", "24")),
+    "hnsw:construction_ef": int(os.getenv("CHROMA_HNSW_EF_CONSTRUCTION", "128")),
+    "hnsw:search_ef": int(os.getenv("CHROMA_HNSW_EF_SEARCH", "100")),
+}
+
+# Columns read for each message being indexed: the document text and its metadata, already in
+# the string form Chroma stores. The metadata carries every TelegramMessage field, so search
+# results can be built without reading the messages table again
+INDEX_SOURCE_SELECT = (
+    "SELECT CAST(telegram_id AS TEXT) AS message_id, CAST(chat_id AS TEXT) AS chat_id, text, "
+    "CASE WHEN sender_id THEN CAST(sender_id AS TEXT) ELSE 'unknown' END AS user_id, "
+    "COALESCE(NULLIF(sender_name, ''), 'Unknown') AS sender_name, CAST(telegram_date AS TEXT) AS timestamp, "
+    "CASE WHEN reply_to_message_id THEN CAST(reply_to_message_id AS TEXT) END AS reply_to_message_id "
+    "FROM messages"
+)
+
+# Written next to the ChromaDB files after each index load, so a restart only indexes what changed
+INDEX_STATE_FILE = "last_indexed_id.json"
+
+# Embeddings of indexed documents, kept next to the ChromaDB files so rebuilds and repeated texts
+# are not sent to OpenAI again
+EMBEDDING_CACHE_FILE = "embedding_cache.db"
+
+# Model used for document and query embeddings
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Number of documents sent to ChromaDB (and the embedding function) per add call
+INDEX_BATCH_SIZE = 512
+
+# Embedding requests in flight while earlier batches are written to ChromaDB
+INDEX_EMBEDDING_WORKERS = 8
+
 
 class MessageSearchTool:
     def __init__(self, chroma_path: str = None, database_url: str = None, expansion_db_url: str = None):
@@ -44,167 +113,326 @@ class MessageSearchTool:
         if not self.expansion_db_url.startswith("sqlite:///"):
             self.expansion_db_url = f"sqlite:///{self.expansion_db_url}"
         
-        # Setup database connection
-        self.engine = create_engine(self.database_url)
+        # Setup database connection, tuned like the app's other SQLite engines (the expansion
+        # engine from the registry already is)
+        self.engine = apply_sqlite_pragmas(create_engine(
+            self.database_url,
+            connect_args={"check_same_thread": False} if self.database_url.startswith("sqlite") else {}
+        ))
         self.SessionLocal = sessionmaker(bind=self.engine)
         
         # Setup expansion database connection
-        self.expansion_engine = create_engine(self.expansion_db_url)
+        self.expansion_engine = get_expansion_engine(self.expansion_db_url)
         self.ExpansionSessionLocal = sessionmaker(bind=self.expansion_engine)
         
-        self.client = chromadb.PersistentClient(
-            path=self.chroma_path
-        )
+        self.client = get_chroma_client(self.chroma_path)
         
         # Use OpenAI embeddings
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY environment variable is required for embeddings")
             
-        openai_ef = embedding_functions.OpenAIEmbeddingFunction(
+        self.embedding_function = embedding_functions.OpenAIEmbeddingFunction(
             api_key=api_key,
-            model_name="text-embedding-3-small"
+            model_name=EMBEDDING_MODEL
         )
+        self.embedding_cache = EmbeddingCache(os.path.join(self.chroma_path, EMBEDDING_CACHE_FILE), EMBEDDING_MODEL)
         
         # Get or create collection with cosine similarity
-        self.collection = self.client.get_or_create_collection(
-            name="telegram_messages",
-            embedding_function=openai_ef,
-            metadata={"hnsw:space": "cosine"}
+        self.collection = self._get_or_create_collection()
+    
+    def _get_or_create_collection(self):
+        """Open the message collection, creating it with the configured HNSW params if missing."""
+        try:
+            collection = self.client.get_collection(
+                name="telegram_messages",
+                embedding_function=self.embedding_function
+            )
+        except ValueError:
+            # Collection does not exist yet
+            return self.client.create_collection(
+                name="telegram_messages",
+                embedding_function=self.embedding_function,
+                metadata=COLLECTION_METADATA
+            )
+        
+        # get_or_create_collection would overwrite the stored metadata while the HNSW index keeps
+        # the parameters it was built with, so an existing collection is left as it is
+        existing = collection.metadata or {}
+        changed = {key: value for key, value in COLLECTION_METADATA.items() if existing.get(key) != value}
+        if changed:
+            logfire.warn(
+                "message collection was built with other HNSW params than {configured}; "
+                "rebuild with TELEQUERY_REBUILD_INDEX=1 to apply them",
+                configured=changed,
+                existing={key: existing.get(key) for key in changed}
+            )
+        return collection
+    
+    def reset_collection(self):
+        """Drop the message collection and recreate it empty, so bulk loads build the index from scratch."""
+        # A freshly created collection is already empty; dropping it would just create it a second time
+        if self.collection.count() == 0:
+            return
+        
+        try:
+            self.client.delete_collection("telegram_messages")
+        except ValueError:
+            # Collection does not exist yet
+            pass
+        self.collection = self._get_or_create_collection()
+    
+    def rebuild_index(self):
+        """Rebuild the vector index from scratch instead of updating the live HNSW graph."""
+        self.reset_collection()
+        self.populate_search_index()
+    
+    def sync_index(self):
+        """Bring the vector index up to date, embedding only messages added or expanded since the last load."""
+        # Full re-embeds are only done on request (or for an empty index); everything else is incremental
+        if os.getenv("TELEQUERY_REBUILD_INDEX") == "1":
+            self.rebuild_index()
+            return
+        
+        state = self._load_index_state()
+        if state is None:
+            indexed = self.collection.count()
+            if indexed == 0:
+                self.populate_search_index()
+                return
+            if indexed != self._count_indexable_messages():
+                # The index predates the state file and is out of date; embed only the messages it lacks
+                self.populate_search_index(skip_ids=set(self.collection.get(include=[])["ids"]))
+                return
+            # The index predates the state file but matches the database; just record where it stands
+            self._save_index_state(self._current_index_state())
+            return
+        
+        if state == self._current_index_state():
+            print("✅ Search index is up to date")
+            return
+        
+        self.populate_search_index(
+            after_message_id=state["last_message_id"],
+            expanded_after=state["last_expansion_at"]
         )
     
+    def _index_state_path(self) -> str:
+        return os.path.join(self.chroma_path, INDEX_STATE_FILE)
+    
+    def _load_index_state(self) -> Optional[dict]:
+        try:
+            with open(self._index_state_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _save_index_state(self, state: dict):
+        os.makedirs(self.chroma_path, exist_ok=True)
+        with open(self._index_state_path(), "w") as f:
+            json.dump(state, f)
+    
+    def _current_index_state(self) -> dict:
+        """Highest message row ID and latest expansion time currently in the databases."""
+        with self.SessionLocal() as source_session:
+            last_message_id = source_session.execute(text("SELECT MAX(id) FROM messages")).scalar()
+        with self.ExpansionSessionLocal() as expansion_session:
+            last_expansion_at = expansion_session.execute(
+                text("SELECT MAX(created_at) FROM message_expansions")
+            ).scalar()
+        return {"last_message_id": last_message_id or 0, "last_expansion_at": last_expansion_at}
+    
+    def _count_indexable_messages(self) -> int:
+        with self.SessionLocal() as source_session:
+            return source_session.execute(
+                text("SELECT COUNT(*) FROM messages WHERE text IS NOT NULL AND text != ''")
+            ).scalar()
+    
     def add_message_to_index(self, message: TelegramMessage):
         """Add a message to the vector index."""
-        # Create a searchable text combining message content with metadata
-        searchable_text = f"{message.text}\nSender: {message.sender_name}\nTime: {message.timestamp}"
-        
-        self.collection.add(
-            documents=[searchable_text],
-            metadatas=[{
-                "message_id": message.message_id,
-                "chat_id": message.chat_id,
-                "user_id": message.user_id,
-                "sender_name": message.sender_name,
-                "timestamp": message.timestamp.isoformat()
-            }],
-            ids=[message.message_id]
-        )
+        self.add_messages_to_index([message])
+
+    def add_messages_to_index(self, messages: List[TelegramMessage], batch_size: int = INDEX_BATCH_SIZE):
+        """Add messages to the vector index, embedding each batch in a single collection.add call."""
+        for batch_start in range(0, len(messages), batch_size):
+            batch = messages[batch_start:batch_start + batch_size]
+
+            self.collection.add(
+                # Searchable text combines message content with metadata
+                documents=[
+                    f"{message.text}\nSender: {message.sender_name}\nTime: {message.timestamp}"
+                    for message in batch
+                ],
+                metadatas=[
+                    {
+                        "message_id": message.message_id,
+                        "chat_id": message.chat_id,
+                        "user_id": message.user_id,
+                        "sender_name": message.sender_name,
+                        "text": message.text,
+                        "timestamp": message.timestamp.isoformat(),
+                        **({"reply_to_message_id": message.reply_to_message_id} if message.reply_to_message_id else {})
+                    }
+                    for message in batch
+                ],
+                ids=[message.message_id for message in batch]
+            )
     
-    def _get_searchable_text(self, message: SourceMessage, expansion_session: Session) -> str:
-        """
-        Fetches the expanded text if it exists; otherwise, returns the original text.
-        This is a helper to be used within populate_search_index.
+    def populate_search_index(
+        self,
+        after_message_id: Optional[int] = None,
+        expanded_after: Optional[str] = None,
+        skip_ids: Optional[set] = None
+    ):
+        """Populate the search index with messages from the database.
+        
+        With `after_message_id`, only messages with a higher row ID and messages expanded after
+        `expanded_after` are (re-)indexed. Messages whose ID is in `skip_ids` are left as they are.
         """
-        expansion = expansion_session.query(MessageExpansion).filter(
-            MessageExpansion.message_id == str(message.telegram_id)
-        ).first()
-        if expansion and expansion.expanded_text:
-            return expansion.expanded_text
-        return message.text or ""
-    
-    def populate_search_index(self):
-        """Populate the search index with all messages from the database."""
         print("🔍 Populating search index from database...")
         
+        # Captured first, so rows written while indexing are picked up again on the next sync
+        index_state = self._current_index_state()
+        
         source_session = self.SessionLocal()
         expansion_session = self.ExpansionSessionLocal()
         
         try:
-            # Get all messages from the source database using raw SQL
-            results = source_session.execute(
-                text("SELECT * FROM messages WHERE text IS NOT NULL AND text != ''")
-            ).fetchall()
-            
-            # Convert raw results to message objects
-            all_source_messages = []
-            for row in results:
-                msg = type('Message', (), {
-                    'id': row[0],
-                    'telegram_id': row[1],
-                    'chat_id': row[2],
-                    'text': row[3],
-                    'message_type': row[4],
-                    'sender_id': row[5],
-                    'sender_name': row[6],
-                    'sender_username': row[7],
-                    'telegram_date': row[8],
-                    'created_at': row[9],
-                    'updated_at': row[10],
-                    'is_outgoing': row[11],
-                    'is_reply': row[12],
-                    'reply_to_message_id': row[13],
-                    'forward_from_id': row[14],
-                    'forward_from_name': row[15],
-                    'media_type': row[16],
-                    'media_file_id': row[17],
-                    'media_file_name': row[18],
-                    'media_file_size': row[19],
-                    # Add properties for compatibility
-                    'message_id': str(row[1]),  # telegram_id
-                    'timestamp': row[8],        # telegram_date
-                    'user_id': str(row[5]) if row[5] else "unknown"  # sender_id
-                })()
-                all_source_messages.append(msg)
-            
-            if not all_source_messages:
-                print("⚠️  No messages found in database")
-                return
-            
-            # Clear existing collection
-            try:
-                self.client.delete_collection("telegram_messages")
-                openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-                    api_key=os.getenv("OPENAI_API_KEY"),
-                    model_name="text-embedding-3-small"
+            # Get the messages to index from the source database using raw SQL
+            if after_message_id is None:
+                results = source_session.execute(
+                    text(f"{INDEX_SOURCE_SELECT} WHERE text IS NOT NULL AND text != ''"),
+                    execution_options={"yield_per": INDEX_BATCH_SIZE}
+                )
+            else:
+                expanded_ids = [
+                    int(message_id) for message_id, in expansion_session.execute(
+                        text("SELECT message_id FROM message_expansions WHERE created_at > :after"),
+                        {"after": expanded_after or ""}
+                    )
+                    if message_id.isdigit()
+                ]
+                # The expanded IDs go in as one JSON array (as in _in_json_ids), so any number of them
+                # stays under SQLite's variable limit and the statement text never changes
+                query = text(
+                    f"{INDEX_SOURCE_SELECT} WHERE text IS NOT NULL AND text != '' "
+                    "AND (id > :after_id OR telegram_id IN (SELECT value FROM json_each(:expanded_ids)))"
                 )
-                self.collection = self.client.get_or_create_collection(
-                    name="telegram_messages",
-                    embedding_function=openai_ef,
-                    metadata={"hnsw:space": "cosine"}
+                results = source_session.execute(
+                    query,
+                    {"after_id": after_message_id, "expanded_ids": json.dumps(expanded_ids)},
+                    execution_options={"yield_per": INDEX_BATCH_SIZE}
                 )
-            except Exception as e:
-                print(f"Warning: Could not clear collection: {e}")
-                pass
             
-            # Add messages to search index
-            documents = []
-            metadatas = []
-            ids = []
+            def document_batches():
+                # Rows stream from SQLite one partition at a time instead of being fetched all at once
+                for rows in results.partitions():
+                    if skip_ids:
+                        rows = [row for row in rows if row.message_id not in skip_ids]
+                        if not rows:
+                            continue
+                    # One lookup per partition for the expansions instead of one query per message
+                    expansions = self._fetch_indexed_expansions(
+                        expansion_session, [row.message_id for row in rows]
+                    )
+                    documents = []
+                    metadatas = []
+                    ids = []
+                    for row in rows:
+                        # Prefer the expanded text for searching, falling back to the original
+                        searchable_text = expansions.get(row.message_id) or row.text or ""
+                        
+                        # Skip if there's no text to index
+                        if not searchable_text:
+                            continue
+                        
+                        documents.append(searchable_text)
+                        metadata = {
+                            "message_id": row.message_id,
+                            "chat_id": row.chat_id,
+                            "user_id": row.user_id,
+                            "sender_name": row.sender_name,
+                            "text": row.text,
+                            "timestamp": row.timestamp
+                        }
+                        # Chroma metadata values cannot be None
+                        if row.reply_to_message_id is not None:
+                            metadata["reply_to_message_id"] = row.reply_to_message_id
+                        metadatas.append(metadata)
+                        ids.append(row.message_id)
+                    
+                    if ids:
+                        yield documents, metadatas, ids
             
-            for message in all_source_messages:
-                # Use the helper to get the best text for searching
-                searchable_text = self._get_searchable_text(message, expansion_session)
-                
-                # Skip if there's no text to index
-                if not searchable_text:
-                    continue
-                
-                documents.append(searchable_text)
-                metadatas.append({
-                    "message_id": str(message.telegram_id),
-                    "chat_id": str(message.chat_id),
-                    "sender_name": message.sender_name or "Unknown",
-                    "timestamp": str(message.telegram_date)
-                })
-                ids.append(str(message.telegram_id))
+            indexed = self._upsert_batches(document_batches())
+            if indexed:
+                print(f"✅ Added {indexed} messages to search index")
+            else:
+                print("⚠️  No messages found in database")
             
-            # Batch add to collection
-            if documents:
-                self.collection.add(
-                    documents=documents,
-                    metadatas=metadatas,
-                    ids=ids
-                )
-                print(f"✅ Added {len(documents)} messages to search index")
+            self._save_index_state(index_state)
         
         finally:
             source_session.close()
             expansion_session.close()
     
+    @staticmethod
+    def _fetch_indexed_expansions(expansion_session: Session, message_ids: List[str]) -> Dict[str, str]:
+        """Get the non-empty expanded texts of the given messages, keyed by message ID."""
+        rows = expansion_session.execute(
+            select(MessageExpansion.message_id, MessageExpansion.expanded_text).where(
+                MessageExpansion.message_id.in_(message_ids),
+                MessageExpansion.expanded_text != ""
+            )
+        )
+        return dict(rows.all())
+    
+    def _upsert_batches(self, batches: Iterator[Tuple[List[str], List[dict], List[str]]]) -> int:
+        """Upsert (documents, metadatas, ids) batches, embedding upcoming batches in worker threads
+        while earlier ones are written to ChromaDB. Documents found in the embedding cache are not
+        embedded again. Returns the number of documents written."""
+        written = 0
+        with ThreadPoolExecutor(max_workers=INDEX_EMBEDDING_WORKERS) as executor:
+            pending = deque()
+            
+            def write_oldest():
+                nonlocal written
+                (documents, metadatas, ids), embeddings, missing, embedded = pending.popleft()
+                if missing:
+                    vectors = embedded.result()
+                    self.embedding_cache.put_many(missing, vectors)
+                    vectors_by_text = dict(zip(missing, vectors))
+                    embeddings = [
+                        vector if vector is not None else vectors_by_text[document]
+                        for document, vector in zip(documents, embeddings)
+                    ]
+                # Upsert so re-expanded messages replace their old entry
+                self.collection.upsert(
+                    documents=documents,
+                    metadatas=metadatas,
+                    ids=ids,
+                    embeddings=embeddings
+                )
+                written += len(ids)
+            
+            for batch in batches:
+                embeddings = self.embedding_cache.get_many(batch[0])
+                # Each distinct uncached text is embedded once, even if it repeats within the batch
+                missing = list(dict.fromkeys(
+                    document for document, vector in zip(batch[0], embeddings) if vector is None
+                ))
+                embedded = executor.submit(self.embedding_function, missing) if missing else None
+                pending.append((batch, embeddings, missing, embedded))
+                if len(pending) >= INDEX_EMBEDDING_WORKERS:
+                    write_oldest()
+            while pending:
+                write_oldest()
+        return written
+    
     async def _rewrite_query(self, original_query: str) -> str:
         """Rewrite user query to be more suitable for semantic search."""
         try:
-            llm_provider = LLMFactory.create_provider("openai")
+            llm_provider = LLMFactory.get_provider("openai")
             
             system_prompt = """You are a query rewriting assistant for semantic search over Telegram messages. 
 Your task is to rewrite user queries to make them more effective for finding relevant messages.
@@ -243,156 +471,172 @@ Return only the rewritten query, nothing else."""
     @log_tool_operation("search_relevant_messages")
     async def search_relevant_messages(self, search_input: SearchToolInput) -> SearchToolOutput:
         """Search for messages using semantic search."""
-        # Rewrite query for better semantic search
-        rewritten_query = await self._rewrite_query(search_input.query_text)
+        # Search with the original query while the LLM rewrites it; the rewrite is only used when the
+        # original finds nothing. ChromaDB and SQLAlchemy calls block, so keep them off the event loop
+        query_text = search_input.query_text
+        rewrite_task = asyncio.create_task(self._rewrite_query(query_text))
+        rewritten_query = None
+        try:
+            results = await asyncio.to_thread(self._vector_topk, search_input, query_text)
+            if not results[0]:
+                rewritten_query = await rewrite_task
+                if rewritten_query.strip() != query_text.strip():
+                    results = await asyncio.to_thread(self._vector_topk, search_input, rewritten_query)
+        finally:
+            # Unless it was awaited above, the rewrite's LLM call is no longer needed
+            rewrite_task.cancel()
+        message_ids, message_scores, top_relevance_score, hit_metadatas = results
+        if not message_ids:
+            return SearchToolOutput.model_construct(messages=[], total_found=0)
+        
+        # Hits indexed with the full message in their metadata need no SQLite round-trip;
+        # debug output also needs the expansions, and older index entries lack the message text
+        if not search_input.debug and all("text" in metadata for metadata in hit_metadatas):
+            telegram_messages = [self._message_from_metadata(metadata) for metadata in hit_metadatas]
+            return SearchToolOutput.model_construct(
+                messages=telegram_messages,
+                total_found=len(telegram_messages),
+                rewritten_query=rewritten_query,
+                top_relevance_score=top_relevance_score
+            )
+        
+        # Message rows and expansions only depend on the matched IDs, so fetch them concurrently
+        if search_input.debug:
+            db_messages, expansions = await asyncio.gather(
+                asyncio.to_thread(self._fetch_messages, message_ids),
+                asyncio.to_thread(self._fetch_expansions, message_ids)
+            )
+        else:
+            db_messages = await asyncio.to_thread(self._fetch_messages, message_ids)
+            expansions = {}
+        
+        # Convert to TelegramMessage objects and maintain search result order; the values are
+        # shaped from typed DB columns already, so construct the models without re-validating them
+        telegram_messages = []
+        messages_with_scores = []
+        
+        messages_by_id = {db_message.message_id: db_message for db_message in db_messages}
+        for message_id in message_ids:
+            db_message = messages_by_id.get(message_id)
+            if db_message is None:
+                continue
+            
+            telegram_msg = TelegramMessage.model_construct(**db_message._mapping)
+            telegram_messages.append(telegram_msg)
+            
+            # If debug mode, attach expanded text and create MessageWithScore
+            if search_input.debug:
+                from ..models.agent import MessageWithScore
+                messages_with_scores.append(MessageWithScore.model_construct(
+                    message=telegram_msg,
+                    relevance_score=message_scores.get(message_id, 0.0),
+                    expanded_text=expansions.get(message_id)
+                ))
         
+        return SearchToolOutput.model_construct(
+            messages=telegram_messages,
+            total_found=len(telegram_messages),
+            messages_with_scores=messages_with_scores if search_input.debug else None,
+            rewritten_query=rewritten_query,
+            top_relevance_score=top_relevance_score
+        )
+    
+    @staticmethod
+    def _message_from_metadata(metadata: dict) -> TelegramMessage:
+        """Build a search hit from the message fields stored in its index metadata."""
+        return TelegramMessage.model_construct(
+            message_id=metadata["message_id"],
+            chat_id=metadata["chat_id"],
+            user_id=metadata.get("user_id", "unknown"),
+            sender_name=metadata["sender_name"],
+            text=metadata["text"],
+            timestamp=datetime.fromisoformat(metadata["timestamp"]),
+            reply_to_message_id=metadata.get("reply_to_message_id")
+        )
+    
+    def _vector_topk(
+        self, search_input: SearchToolInput, query_text: str
+    ) -> Tuple[List[str], Dict[str, float], Optional[float], List[dict]]:
+        """Run the vector search for `query_text` and return matching message IDs, their debug scores,
+        the best score and the matches' metadata."""
         # Build metadata filters
         where_clause = {}
         if search_input.chat_id:
             where_clause["chat_id"] = search_input.chat_id
         
-        # Perform semantic search with rewritten query
+        # Perform semantic search
         try:
             results = self.collection.query(
-                query_texts=[rewritten_query],
+                query_texts=[query_text],
                 n_results=100,
                 where=where_clause if where_clause else None,
-                include=["metadatas", "distances", "documents"] if search_input.debug else ["metadatas", "distances"]
+                # Documents are never pulled out of Chroma: message text comes from the metadata,
+                # or from SQLite in debug mode and for older entries indexed without it
+                include=["metadatas", "distances"]
             )
         except Exception as e:
             print(f"Search error: {e}")
-            return SearchToolOutput(messages=[], total_found=0)
+            return [], {}, None, []
         
-        if not results["ids"] or not results["ids"][0]:
-            return SearchToolOutput(messages=[], total_found=0)
+        # Single-query results: unpack the first (and only) row of each field once
+        ids = results["ids"][0] if results.get("ids") else None
+        if not ids:
+            return [], {}, None, []
+        metadatas = results["metadatas"][0]
+        distances = results["distances"][0] if results.get("distances") else None
+        if not distances:
+            return [], {}, None, []
         
         # Extract message_ids and scores from the results  
         # With cosine similarity: distances 0-2, where 0=identical, 2=opposite
         # Filter by distance threshold (0.75 means max cosine distance allowed)
         DISTANCE_THRESHOLD = 0.75
-        message_ids = []
-        message_scores = {}
         
-        for i, metadata in enumerate(results["metadatas"][0]):
-            message_id = metadata["message_id"]
-            
-            # Get cosine distance
-            distance = results["distances"][0][i] if results.get("distances") else 2.0
-            
-            # Check distance threshold (skip if distance is too high)
-            if distance > DISTANCE_THRESHOLD:
-                continue  # Skip messages that are not similar enough
-                
-            message_ids.append(message_id)
-            if search_input.debug:
-                # For display, convert to similarity score (1 - distance)
-                message_scores[message_id] = 1.0 - distance
+        # Results are ordered by distance, so the matches within the threshold are a prefix
+        # found with one binary search instead of a comparison per result
+        kept = bisect_right(distances, DISTANCE_THRESHOLD)
+        hit_metadatas = metadatas[:kept]
+        message_ids = [metadata["message_id"] for metadata in hit_metadatas]
         
-        # Get full message details from database using raw SQL
-        with self.SessionLocal() as session:
-            if message_ids:
-                # Convert message_ids to integers, filtering out non-numeric values
-                int_message_ids = [int(mid) for mid in message_ids if mid.isdigit()]
-                if int_message_ids:
-                    placeholders = ','.join([f':id{i}' for i in range(len(int_message_ids))])
-                    query = f"SELECT * FROM messages WHERE telegram_id IN ({placeholders})"
-                    params = {f'id{i}': mid for i, mid in enumerate(int_message_ids)}
-                    results = session.execute(text(query), params).fetchall()
-                else:
-                    results = []
-                
-                # Convert raw results to message objects
-                db_messages = []
-                for row in results:
-                    msg = type('Message', (), {
-                        'id': row[0],
-                        'telegram_id': row[1],
-                        'chat_id': row[2],
-                        'text': row[3],
-                        'message_type': row[4],
-                        'sender_id': row[5],
-                        'sender_name': row[6],
-                        'sender_username': row[7],
-                        'telegram_date': row[8],
-                        'created_at': row[9],
-                        'updated_at': row[10],
-                        'is_outgoing': row[11],
-                        'is_reply': row[12],
-                        'reply_to_message_id': row[13],
-                        'forward_from_id': row[14],
-                        'forward_from_name': row[15],
-                        'media_type': row[16],
-                        'media_file_id': row[17],
-                        'media_file_name': row[18],
-                        'media_file_size': row[19],
-                        # Add properties for compatibility
-                        'message_id': str(row[1]),  # telegram_id
-                        'timestamp': row[8],        # telegram_date
-                        'user_id': str(row[5]) if row[5] else "unknown"  # sender_id
-                    })()
-                    db_messages.append(msg)
-            else:
-                db_messages = []
+        # The first kept match is the best one
+        top_relevance_score = 1.0 - distances[0] if kept else None
         
-        # Convert to TelegramMessage objects and maintain search result order
-        telegram_messages = []
-        messages_with_scores = []
-        
-        # Get expansion session if in debug mode
-        expansion_session = self.ExpansionSessionLocal() if search_input.debug else None
+        # For display, convert to similarity scores (1 - distance)
+        message_scores = {}
+        if search_input.debug:
+            message_scores = {
+                message_id: 1.0 - distance for message_id, distance in zip(message_ids, distances)
+            }
         
-        try:
-            for message_id in message_ids:
-                for db_message in db_messages:
-                    if str(db_message.telegram_id) == message_id:
-                        telegram_msg = TelegramMessage(
-                            message_id=str(db_message.telegram_id),
-                            chat_id=str(db_message.chat_id),
-                            user_id=str(db_message.sender_id) if db_message.sender_id else "unknown",
-                            sender_name=db_message.sender_name or "Unknown",
-                            text=db_message.text or "",
-                            timestamp=db_message.telegram_date,
-                            reply_to_message_id=str(db_message.reply_to_message_id) if db_message.reply_to_message_id else None
-                        )
-                        telegram_messages.append(telegram_msg)
-                        
-                        # If debug mode, get expanded text and create MessageWithScore
-                        if search_input.debug:
-                            from ..models.agent import MessageWithScore
-                            expanded_text = None
-                            if expansion_session:
-                                expansion = expansion_session.query(MessageExpansion).filter(
-                                    MessageExpansion.message_id == message_id
-                                ).first()
-                                if expansion:
-                                    expanded_text = expansion.expanded_text
-                            
-                            messages_with_scores.append(MessageWithScore(
-                                message=telegram_msg,
-                                relevance_score=message_scores.get(message_id, 0.0),
-                                expanded_text=expanded_text
-                            ))
-                        break
-        finally:
-            if expansion_session:
-                expansion_session.close()
+        return message_ids, message_scores, top_relevance_score, hit_metadatas
+    
+    def _fetch_messages(self, message_ids: List[str]) -> list:
+        """Get the message columns needed for TelegramMessage as plain Core rows (no ORM hydration)."""
+        # Convert message_ids to integers, filtering out non-numeric values
+        int_message_ids = [int(mid) for mid in message_ids if mid.isdigit()]
+        if not int_message_ids:
+            return []
         
-        return SearchToolOutput(
-            messages=telegram_messages,
-            total_found=len(telegram_messages),
-            messages_with_scores=messages_with_scores if search_input.debug else None,
-            rewritten_query=rewritten_query
-        )
+        with self.SessionLocal() as session:
+            return session.execute(MESSAGE_RESULT_QUERY, {"ids": json.dumps(int_message_ids)}).all()
+    
+    def _fetch_expansions(self, message_ids: List[str]) -> Dict[str, str]:
+        """Get expanded texts for the given message IDs in a single query."""
+        with self.ExpansionSessionLocal() as expansion_session:
+            rows = expansion_session.execute(EXPANSION_RESULT_QUERY, {"ids": json.dumps(message_ids)}).all()
+        return {message_id: expanded_text for message_id, expanded_text in rows}
 
 
-# Global instance - will be initialized when needed
-search_tool = None
+# Search tool instances keyed by (database_url, chroma_path, expansion_db_url) - initialized when needed
+_search_tools = {}
 
 def get_search_tool(database_url: str = None, chroma_path: str = None, expansion_db_url: str = None):
-    """Get or create the search tool instance."""
-    global search_tool
+    """Get or create the search tool instance for the given configuration."""
+    key = (database_url, chroma_path, expansion_db_url)
+    search_tool = _search_tools.get(key)
     if search_tool is None:
         search_tool = MessageSearchTool(chroma_path=chroma_path, database_url=database_url, expansion_db_url=expansion_db_url)
-        # Populate search index on first use
-        search_tool.populate_search_index()
+        # Catch the search index up with the databases on first use
+        search_tool.sync_index()
+        _search_tools[key] = search_tool
     return search_tool
@@ -1,4 +1,5 @@
 import pytest
+from unittest.mock import AsyncMock, Mock, patch
 from fastapi.testclient import TestClient
 
 from src.api.app import app
@@ -14,4 +15,37 @@ def test_health_check():
     
     data = response.json()
     assert data["status"] == "ok"
-    assert data["version"] == "1.1"
\ No newline at end of file
+    assert data["version"] == "1.1"
+
+
+def test_query_unhandled_error_returns_error_response():
+    """Test that unexpected errors become a 500 error QueryResponse"""
+    agent = Mock()
+    agent.process_query = AsyncMock(side_effect=RuntimeError("boom"))
+    app.state.agent = agent
+    error_client = TestClient(app, raise_server_exceptions=False)
+    
+    try:
+        response = error_client.post(
+            "/query",
+            json={"user_question": "What happened?", "telegram_user_id": "123"}
+        )
+    finally:
+        del app.state.agent
+    
+    assert response.status_code == 500
+    data = response.json()
+    assert data["status"] == "error"
+    assert "boom" in data["answer_text"]
+    assert data["source_messages"] == []
+
+
+def test_status_unhandled_error_returns_generic_error():
+    """Test that unexpected errors outside /query return a generic 500 without the exception text"""
+    error_client = TestClient(app, raise_server_exceptions=False)
+    
+    with patch("src.api.app.get_query_cache", side_effect=RuntimeError("secret detail")):
+        response = error_client.get("/status")
+    
+    assert response.status_code == 500
+    assert response.json() == {"detail": "Internal Server Error"}
@@ -0,0 +1,23 @@
+from unittest.mock import patch
+
+from src.clients import registry
+from src.clients.registry import get_expansion_engine
+
+
+def test_expansion_engine_is_shared_per_url(tmp_path):
+    """Test that the same expansion database URL reuses one engine"""
+    url = f"sqlite:///{tmp_path / 'expansions.db'}"
+    other_url = f"sqlite:///{tmp_path / 'other.db'}"
+    
+    # Engines registered here are dropped from the process-wide registry afterwards
+    with patch.dict(registry._CLIENTS):
+        engine = get_expansion_engine(url)
+        other_engine = get_expansion_engine(other_url)
+        try:
+            assert get_expansion_engine(url) is engine
+            assert other_engine is not engine
+        finally:
+            engine.dispose()
+            other_engine.dispose()
+    
+    assert ("expansion_engine", url) not in registry._CLIENTS
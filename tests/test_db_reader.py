@@ -0,0 +1,20 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from src.db_reader import TelegramDBReader
+
+
+def test_connections_are_cached_per_thread(tmp_path):
+    """Test readers share a connection within a thread but never across threads"""
+    db_path = str(tmp_path / "telegram_messages.db")
+    sqlite3.connect(db_path).close()
+    
+    with TelegramDBReader(db_path) as reader:
+        connection = reader.conn
+        assert TelegramDBReader(db_path).conn is connection
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            other_connection = executor.submit(lambda: reader.conn).result()
+    
+    assert other_connection is not connection
+    # Opening the reader left the database in its default rollback journal mode
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
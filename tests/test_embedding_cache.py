@@ -0,0 +1,36 @@
+import pytest
+
+from src.indexing.embedding_cache import EmbeddingCache
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "cache.db")
+
+
+@pytest.fixture
+def cache(cache_path):
+    """Cache for model-a, closed even when the test fails"""
+    cache = EmbeddingCache(cache_path, "model-a")
+    yield cache
+    cache.close()
+
+
+class TestEmbeddingCache:
+    """Test cases for EmbeddingCache"""
+    
+    def test_get_many_returns_none_for_misses(self, cache):
+        """Test uncached texts come back as None in input order"""
+        cache.put_many(["hello"], [[0.5, -1.0, 2.0]])
+        
+        assert cache.get_many(["bye", "hello"]) == [None, [0.5, -1.0, 2.0]]
+    
+    def test_entries_are_scoped_to_model(self, cache, cache_path):
+        """Test the same text embedded by another model is a miss"""
+        cache.put_many(["hello"], [[1.0, 2.0]])
+        
+        other = EmbeddingCache(cache_path, "model-b")
+        try:
+            assert other.get_many(["hello"]) == [None]
+        finally:
+            other.close()
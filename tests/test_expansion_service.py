@@ -0,0 +1,74 @@
+import asyncio
+import json
+import re
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, insert, text
+
+from src.clients import registry
+from src.llm.base import LLMResponse
+from src.llm.factory import LLMFactory
+from src.models.schema import Base, Message
+from src.services.expansion_service import ExpansionService
+
+
+class StallingProvider:
+    """Fake LLM that expands the first `completed` batches and leaves the rest hanging"""
+    
+    def __init__(self, completed: int):
+        self.completed = completed
+        self.calls = 0
+        self.all_completed = asyncio.Event()
+    
+    async def generate_response(self, system_prompt, user_prompt, **kwargs):
+        self.calls += 1
+        if self.calls > self.completed:
+            await asyncio.Event().wait()
+        if self.calls == self.completed:
+            self.all_completed.set()
+        
+        ids = re.search(r"standalone: (.*)\n", user_prompt).group(1).split(", ")
+        expansions = [
+            {"message_id": message_id, "original_text": "", "expanded_text": f"expanded {message_id}"}
+            for message_id in ids
+        ]
+        return LLMResponse(content=json.dumps({"expansions": expansions}), model="fake")
+
+
+@pytest.mark.asyncio
+async def test_cancelled_run_keeps_finished_expansions(tmp_path):
+    """Test that expansions finished before a run is cancelled are saved"""
+    database_url = f"sqlite:///{tmp_path / 'messages.db'}"
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Message), [
+            dict(
+                telegram_id=1000 + i, chat_id=1, text=f"message {i}", message_type="text",
+                sender_id=1, sender_name="Alice", telegram_date=start + timedelta(minutes=i)
+            )
+            for i in range(100)
+        ])
+    engine.dispose()
+    
+    provider = StallingProvider(completed=4)
+    with patch.dict(registry._CLIENTS), patch.object(LLMFactory, "get_provider", return_value=provider):
+        service = ExpansionService(database_url, str(tmp_path / "expansions.db"))
+        task = asyncio.create_task(service.process_new_messages(batch_size=10))
+        
+        await asyncio.wait_for(provider.all_completed.wait(), timeout=10)
+        # Let the finished batches hand their rows back before cancelling
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        
+        with service.expansion_engine.connect() as conn:
+            saved = conn.execute(text("SELECT COUNT(*) FROM message_expansions")).scalar()
+        service.source_engine.dispose()
+        service.expansion_engine.dispose()
+    
+    assert saved == 40
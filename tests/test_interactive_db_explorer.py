@@ -0,0 +1,130 @@
+import asyncio
+import os
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+from src.interactive_db_explorer import InteractiveTelegramExplorer, read_line
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Small unprepared Telegram database: no FTS table, aggregates or explorer indexes"""
+    path = str(tmp_path / "telegram_messages.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE chats(id INTEGER PRIMARY KEY, name TEXT, chat_type TEXT, username TEXT);
+        CREATE TABLE messages(
+            id INTEGER PRIMARY KEY, chat_id INTEGER, text TEXT, sender_name TEXT, 
+            telegram_date TEXT, media_type TEXT
+        );
+        INSERT INTO chats VALUES (1, 'Team', 'group', NULL);
+        INSERT INTO messages(chat_id, text, sender_name, telegram_date) VALUES 
+            (1, 'hello world', 'Alice', '2024-01-01'), 
+            (1, 'see you tomorrow', 'Bob', '2024-01-02');
+    """)
+    conn.close()
+    return path
+
+
+def table_names(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    finally:
+        conn.close()
+
+
+class TestInteractiveTelegramExplorer:
+    """Test cases for InteractiveTelegramExplorer"""
+    
+    def test_browses_unprepared_database_without_writing(self, db_path, capsys):
+        """Test stats, chats and text search work without the prepared tables and create none"""
+        explorer = InteractiveTelegramExplorer(db_path)
+        try:
+            explorer.get_stats()
+            explorer.list_chats()
+            explorer.search_by_text("world")
+        finally:
+            explorer.close()
+        
+        output = capsys.readouterr().out
+        assert "Total messages: 2" in output
+        assert "[1] Team - group (2 messages)" in output
+        assert "Alice: hello world" in output
+        assert table_names(db_path) == {"chats", "messages"}
+    
+    def test_failed_prepare_falls_back_to_read_only(self, db_path, capsys):
+        """Test a database that cannot be prepared is still browsed"""
+        error = sqlite3.OperationalError("attempt to write a readonly database")
+        with patch.object(InteractiveTelegramExplorer, "_ensure_indexes", side_effect=error):
+            explorer = InteractiveTelegramExplorer(db_path, prepare=True)
+        try:
+            assert not explorer.has_fts
+            explorer.search_by_text("tomorrow")
+        finally:
+            explorer.close()
+        
+        output = capsys.readouterr().out
+        assert "Could not prepare the database" in output
+        assert "Bob: see you tomorrow" in output
+    
+    def test_prepare_creates_search_tables(self, db_path):
+        """Test --prepare builds the FTS table and aggregates"""
+        explorer = InteractiveTelegramExplorer(db_path, prepare=True)
+        explorer.close()
+        
+        assert explorer.has_fts and explorer.has_aggregates
+        assert {"messages_fts", "sender_counts", "chat_message_counts", "global_stats"} <= table_names(db_path)
+    
+    def test_close_runs_optimize_after_prepare(self, db_path):
+        """Test closing a prepared explorer stores planner statistics for the indexes browsing used"""
+        explorer = InteractiveTelegramExplorer(db_path, prepare=True)
+        conn = sqlite3.connect(db_path)
+        conn.execute("DELETE FROM sqlite_stat1")
+        conn.commit()
+        conn.close()
+        
+        explorer.close()
+        
+        conn = sqlite3.connect(db_path)
+        try:
+            stats = conn.execute("SELECT idx FROM sqlite_stat1 WHERE tbl = 'messages'").fetchall()
+        finally:
+            conn.close()
+        assert ("ix_messages_chat_date",) in stats
+    
+    def test_close_without_prepare_does_not_write(self, db_path):
+        """Test closing an explorer that was not prepared leaves the database untouched"""
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE INDEX ix_messages_chat_date ON messages(chat_id, telegram_date DESC)")
+        conn.close()
+        
+        explorer = InteractiveTelegramExplorer(db_path)
+        with patch("sqlite3.connect", wraps=sqlite3.connect) as connect:
+            explorer.close()
+        
+        connect.assert_not_called()
+        assert "sqlite_stat1" not in table_names(db_path)
+
+
+@pytest.mark.asyncio
+async def test_read_line_keeps_lines_read_ahead():
+    """Test lines arriving in one read are returned by successive read_line calls"""
+    read_fd, write_fd = os.pipe()
+    with open(read_fd) as stdin, patch("sys.stdin", stdin):
+        os.write(write_fd, "4\nпривет\n".encode())
+        assert await read_line() == "4"
+        assert await read_line() == "привет"
+        
+        # Nothing buffered now: the next call waits for stdin without blocking the event loop
+        pending = asyncio.ensure_future(read_line())
+        await asyncio.sleep(0.05)
+        assert not pending.done()
+        os.write(write_fd, b"0\n")
+        assert await asyncio.wait_for(pending, timeout=5) == "0"
+        
+        os.close(write_fd)
+        with pytest.raises(EOFError):
+            await read_line()
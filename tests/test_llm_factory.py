@@ -1,8 +1,9 @@
 import pytest
 import os
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, ANY
 
 from src.llm.factory import LLMFactory
+from src.llm.base import LLM_MAX_RETRIES
 
 
 class TestLLMFactory:
@@ -79,4 +80,31 @@ class TestLLMFactory:
         provider = LLMFactory.create_provider("openai", api_key="test-key")
         
         assert provider.__class__.__name__ == "OpenAIProvider"
-        mock_openai_client.assert_called_once_with(api_key="test-key")
\ No newline at end of file
+        mock_openai_client.assert_called_once_with(api_key="test-key", http_client=ANY, max_retries=LLM_MAX_RETRIES)
+    
+    @patch('src.llm.openai_provider.AsyncOpenAI')
+    def test_get_provider_reuses_instance(self, mock_openai_client):
+        """Test that get_provider returns the same shared provider"""
+        mock_openai_client.return_value = Mock()
+        
+        with patch.dict(LLMFactory._instances, clear=True):
+            with patch.dict(os.environ, {"OPENAI_API_KEY": "test-key"}):
+                first = LLMFactory.get_provider("openai")
+                second = LLMFactory.get_provider("openai")
+        
+        assert first is second
+        mock_openai_client.assert_called_once()
+    
+    @patch('src.llm.openai_provider.AsyncOpenAI')
+    def test_get_provider_separates_api_keys(self, mock_openai_client):
+        """Test that get_provider keeps one shared provider per API key"""
+        mock_openai_client.side_effect = lambda **kwargs: Mock()
+        
+        with patch.dict(LLMFactory._instances, clear=True):
+            first = LLMFactory.get_provider("openai", api_key="key-a")
+            second = LLMFactory.get_provider("openai", api_key="key-b")
+            again = LLMFactory.get_provider("openai", api_key="key-a")
+        
+        assert first is again
+        assert first is not second
+        assert mock_openai_client.call_count == 2
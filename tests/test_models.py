@@ -1,10 +1,32 @@
 import pytest
 from datetime import datetime
-from pydantic import ValidationError
+from typing import List
+from pydantic import TypeAdapter, ValidationError
 
 from src.models.api import QueryRequest, QueryResponse, HealthCheckResponse, SourceMessage
 
 
+# Validates a whole list of raw source messages in one pydantic-core call
+SOURCE_MESSAGES_ADAPTER = TypeAdapter(List[SourceMessage])
+
+
+@pytest.fixture(scope="module")
+def sample_timestamp():
+    """Timestamp shared by the message tests"""
+    return datetime(2024, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture(scope="module")
+def sample_source_message(sample_timestamp):
+    """SourceMessage validated once and shared by the tests that only read it"""
+    return SourceMessage(
+        message_id="msg_123",
+        sender="John Doe",
+        timestamp=sample_timestamp,
+        text="Hello world"
+    )
+
+
 class TestAPIModels:
     """Test cases for API models"""
     
@@ -20,73 +42,65 @@ class TestAPIModels:
         assert response.status == "healthy"
         assert response.version == "2.0"
     
-    def test_query_request_valid(self):
-        """Test valid QueryRequest"""
+    @pytest.mark.parametrize("chat_id", ["456", None])
+    def test_query_request_valid(self, chat_id):
+        """Test valid QueryRequest, with and without chat_id"""
         request = QueryRequest(
             user_question="What is Python?",
             telegram_user_id="123",
-            telegram_chat_id="456"
-        )
-        assert request.user_question == "What is Python?"
-        assert request.telegram_user_id == "123"
-        assert request.telegram_chat_id == "456"
-    
-    def test_query_request_no_chat_id(self):
-        """Test QueryRequest without chat_id"""
-        request = QueryRequest(
-            user_question="What is Python?",
-            telegram_user_id="123"
+            **({"telegram_chat_id": chat_id} if chat_id else {})
         )
-        assert request.telegram_chat_id is None
+        assert request.model_dump() == {
+            "user_question": "What is Python?",
+            "telegram_user_id": "123",
+            "telegram_chat_id": chat_id,
+            "debug": False
+        }
     
     def test_query_request_missing_required_field(self):
         """Test QueryRequest with missing required field"""
         with pytest.raises(ValidationError):
             QueryRequest(telegram_user_id="123")
     
-    def test_source_message_valid(self):
+    def test_source_message_valid(self, sample_source_message, sample_timestamp):
         """Test valid SourceMessage"""
-        timestamp = datetime(2024, 1, 1, 12, 0, 0)
-        message = SourceMessage(
-            message_id="msg_123",
-            sender="John Doe",
-            timestamp=timestamp,
-            text="Hello world"
-        )
-        assert message.message_id == "msg_123"
-        assert message.sender == "John Doe"
-        assert message.timestamp == timestamp
-        assert message.text == "Hello world"
+        assert sample_source_message.model_dump() == {
+            "message_id": "msg_123",
+            "sender": "John Doe",
+            "timestamp": sample_timestamp,
+            "text": "Hello world",
+            "expanded_text": None,
+            "relevance_score": None
+        }
     
-    def test_query_response_valid(self):
-        """Test valid QueryResponse"""
-        timestamp = datetime(2024, 1, 1, 12, 0, 0)
-        source_message = SourceMessage(
-            message_id="msg_123",
-            sender="John Doe",
-            timestamp=timestamp,
-            text="Python is great"
-        )
-        
+    @pytest.mark.parametrize("with_sources, status", [(True, "success"), (False, "no_results")])
+    def test_query_response_valid(self, sample_source_message, with_sources, status):
+        """Test valid QueryResponse, with and without source messages"""
+        source_messages = [sample_source_message] if with_sources else []
         response = QueryResponse(
             answer_text="Python is a programming language",
-            source_messages=[source_message],
-            status="success"
+            source_messages=source_messages,
+            status=status
         )
         
         assert response.answer_text == "Python is a programming language"
-        assert len(response.source_messages) == 1
-        assert response.status == "success"
-        assert response.source_messages[0].sender == "John Doe"
+        assert response.status == status
+        if with_sources:
+            assert response.source_messages and response.source_messages[0].sender == "John Doe"
+        else:
+            assert not response.source_messages
     
-    def test_query_response_empty_sources(self):
-        """Test QueryResponse with empty source messages"""
+    def test_query_response_bulk_validated_sources(self, sample_timestamp):
+        """Test a list of raw source messages validated in one pass is accepted by QueryResponse"""
+        source_messages = SOURCE_MESSAGES_ADAPTER.validate_python([
+            {"message_id": f"msg_{i}", "sender": "John Doe", "timestamp": sample_timestamp, "text": f"Message {i}"}
+            for i in range(3)
+        ])
         response = QueryResponse(
-            answer_text="No relevant information found",
-            source_messages=[],
-            status="no_results"
+            answer_text="Python is a programming language",
+            source_messages=source_messages,
+            status="success"
         )
         
-        assert response.answer_text == "No relevant information found"
-        assert len(response.source_messages) == 0
-        assert response.status == "no_results"
\ No newline at end of file
+        assert [message.message_id for message in response.source_messages] == ["msg_0", "msg_1", "msg_2"]
+        assert all(isinstance(message, SourceMessage) for message in response.source_messages)
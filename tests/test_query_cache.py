@@ -0,0 +1,53 @@
+from unittest.mock import patch
+
+from src.cache.query_cache import QueryCache, normalize_query
+
+
+class TestQueryCache:
+    """Test cases for QueryCache"""
+    
+    def test_normalize_query(self):
+        """Test that case and whitespace differences are normalized"""
+        assert normalize_query("  What   about\tPython? ") == "what about python?"
+    
+    def test_make_key_uses_normalized_query_and_scope(self):
+        """Test cache keys match for equivalent questions in the same scope only"""
+        key = QueryCache.make_key("What about Python?", "chat-1", False)
+        assert QueryCache.make_key("what  about python?", "chat-1", False) == key
+        assert QueryCache.make_key("What about Python?", "chat-2", False) != key
+    
+    def test_get_and_set(self):
+        """Test cache hits and misses are counted"""
+        cache = QueryCache(max_size=10, ttl_seconds=60)
+        assert cache.get("key") is None
+        
+        cache.set("key", "value")
+        assert cache.get("key") == "value"
+        
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["size"] == 1
+        assert stats["hit_rate"] == 0.5
+    
+    def test_evicts_least_recently_used(self):
+        """Test the least recently used entry is evicted when full"""
+        cache = QueryCache(max_size=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+    
+    def test_expired_entries_are_dropped(self):
+        """Test entries older than the TTL are treated as misses"""
+        cache = QueryCache(max_size=10, ttl_seconds=60)
+        with patch("src.cache.query_cache.time.monotonic", return_value=1000.0):
+            cache.set("key", "value")
+        with patch("src.cache.query_cache.time.monotonic", return_value=1061.0):
+            assert cache.get("key") is None
+        
+        assert cache.stats()["size"] == 0
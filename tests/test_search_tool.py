@@ -0,0 +1,76 @@
+import asyncio
+from unittest.mock import patch
+
+import chromadb
+import pytest
+
+from src.models.agent import SearchToolInput
+from src.tools.search import COLLECTION_METADATA, MessageSearchTool
+
+HIT_METADATA = {
+    "message_id": "1", "chat_id": "1", "user_id": "1", "sender_name": "Alice",
+    "text": "sauna on friday", "timestamp": "2024-01-01T10:00:00"
+}
+HIT = (["1"], {}, 0.9, [HIT_METADATA])
+NO_HITS = ([], {}, None, [])
+
+
+@pytest.fixture
+def search_tool():
+    """Search tool without Chroma or database connections; tests patch the search steps"""
+    return MessageSearchTool.__new__(MessageSearchTool)
+
+
+@pytest.mark.asyncio
+async def test_original_hits_skip_the_rewrite(search_tool):
+    """Test original-query hits are returned without waiting for the rewrite"""
+    rewrite_cancelled = asyncio.Event()
+    
+    async def slow_rewrite(query):
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            rewrite_cancelled.set()
+            raise
+    
+    with patch.object(search_tool, "_rewrite_query", side_effect=slow_rewrite), \
+            patch.object(search_tool, "_vector_topk", return_value=HIT) as vector_topk:
+        result = await asyncio.wait_for(
+            search_tool.search_relevant_messages(SearchToolInput(query_text="sauna")), timeout=5
+        )
+        await asyncio.wait_for(rewrite_cancelled.wait(), timeout=5)
+    
+    assert [message.text for message in result.messages] == ["sauna on friday"]
+    assert result.rewritten_query is None
+    vector_topk.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_rewrite_is_searched_when_original_finds_nothing(search_tool):
+    """Test the rewritten query is searched only after the original comes back empty"""
+    async def rewrite(query):
+        return "sauna steam bath"
+    
+    with patch.object(search_tool, "_rewrite_query", side_effect=rewrite), \
+            patch.object(search_tool, "_vector_topk", side_effect=[NO_HITS, HIT]) as vector_topk:
+        result = await search_tool.search_relevant_messages(SearchToolInput(query_text="banya"))
+    
+    assert result.rewritten_query == "sauna steam bath"
+    assert result.total_found == 1
+    assert [call.args[1] for call in vector_topk.call_args_list] == ["banya", "sauna steam bath"]
+
+
+def test_existing_collection_keeps_its_hnsw_metadata(search_tool, tmp_path):
+    """Test a collection built with other HNSW params is opened unchanged and flagged for a rebuild"""
+    search_tool.client = chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    search_tool.embedding_function = None
+    search_tool.client.create_collection("telegram_messages", metadata={"hnsw:space": "cosine"})
+    
+    with patch("src.tools.search.logfire.warn") as warn:
+        collection = search_tool._get_or_create_collection()
+    
+    assert collection.metadata == {"hnsw:space": "cosine"}
+    warn.assert_called_once()
+    assert warn.call_args.kwargs["configured"] == {
+        key: value for key, value in COLLECTION_METADATA.items() if key != "hnsw:space"
+    }
@@ -0,0 +1,36 @@
+from datetime import datetime
+from unittest.mock import Mock, patch
+
+import pytest
+
+from src.agent import telequery_agent
+from src.agent.telequery_agent import TelequeryAgent
+from src.llm.factory import LLMFactory
+from src.models.database import TelegramMessage
+
+
+@pytest.fixture
+def no_encoding():
+    """Make the tiktoken encoding fail to load, as it does offline without a cached copy"""
+    telequery_agent._get_encoding.cache_clear()
+    with patch.object(telequery_agent.tiktoken, "get_encoding", side_effect=ConnectionError("offline")):
+        yield
+    telequery_agent._get_encoding.cache_clear()
+
+
+def test_prompt_budget_falls_back_to_length_estimate(no_encoding):
+    """Test the context budget is estimated from text length when tiktoken cannot load"""
+    with patch.object(LLMFactory, "get_provider", return_value=Mock()):
+        agent = TelequeryAgent(max_context_tokens=100)
+    messages = [
+        TelegramMessage(
+            message_id=str(i), chat_id="1", user_id="1", sender_name="Alice",
+            text="x" * 120, timestamp=datetime(2024, 1, 1)
+        )
+        for i in range(5)
+    ]
+    
+    prompt = agent._create_llm_prompt("What happened?", messages)
+    
+    # Each formatted message is ~160 characters, about 40 estimated tokens
+    assert len(prompt.context_messages) == 2